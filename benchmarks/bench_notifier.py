@@ -0,0 +1,355 @@
+"""
+Overhead of the notifier per training step: python benchmarks/bench_notifier.py [--output results.json]
+
+Synthetic training loops (custom loop with the notifier API, Keras CallbackSimple, Chainer
+ExtensionNotifierReport) run against the local fake telegram API (see fake_telegram.py).
+The step is a sleep of --step-time seconds, the time spent in the notifier hooks is measured
+on each step. During the training /pause and /continue are sent through the API, the latency
+is measured from the command to the delivery of the reply of the training loop.
+
+Results are printed (and written to --output) as JSON: per loop percentiles of the overhead
+per step (microseconds), share of the wall time, API calls per epoch and command latency (ms).
+Loops of frameworks which are not installed are reported as skipped. --notifier async runs
+NotifierTelegramAsync instead of NotifierTelegram, with --webhook the commands are POSTed to the
+webhook server of the notifier instead of the long polling
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_telegram import SEND_METHODS, FakeTelegramAPI, post_update  # noqa: E402
+from notifyker.notifiers import PRIORITY_HIGH, RateLimiter, Webhook  # noqa: E402
+from notifyker.utils import ReportPolicy  # noqa: E402
+
+
+def percentiles(values, points=(50, 90, 99)):
+    if not values:
+        return {}
+
+    values = sorted(values)
+    result = {'p{}'.format(p): values[min(int(len(values) * p / 100), len(values) - 1)] for p in points}
+    result['max'] = values[-1]
+    result['mean'] = sum(values) / len(values)
+
+    return result
+
+
+def make_notifier(api, args):
+    # commands are POSTed to the local server without the registration of the webhook
+    webhook = Webhook(port=0) if args.webhook else None
+
+    if args.notifier == 'async':
+        from notifyker.notifiers import NotifierTelegramAsync
+
+        notifier = NotifierTelegramAsync(TOKEN='123456:benchmark', chat_id=1, base_url=api.base_url,
+                                         rate_limiter=RateLimiter(chat_rate=args.chat_rate, burst=args.burst),
+                                         webhook=webhook)
+        notifier.verbose_value = args.verbose
+
+        return notifier
+
+    from notifyker.notifiers import NotifierTelegram
+
+    notifier = NotifierTelegram(TOKEN='123456:benchmark', chat_id=1, base_url=api.base_url,
+                                async_send=args.async_send, sync_max_wait=args.sync_max_wait,
+                                rate_limiter=RateLimiter(chat_rate=args.chat_rate, burst=args.burst), webhook=webhook)
+    notifier.verbose_value = args.verbose
+
+    return notifier
+
+
+class Commands(threading.Thread):
+    """
+    Send /pause and /continue during the training, measure the time to the reply of the training loop
+    """
+    def __init__(self, api, count, delay, interval, timeout=10, webhook=None):
+        super().__init__(name='benchmark-commands', daemon=True)
+        self.api = api
+        self.webhook = webhook  # Webhook of the notifier, None - the commands are polled
+        self.count = count
+        self.delay = delay
+        self.interval = interval
+        self.timeout = timeout
+
+        self.done = threading.Event()  # set by the training loop at the end
+        self.pause = []
+        self.resume = []
+
+    def run(self):
+        for _ in range(self.count):
+            if self.done.wait(self.delay if not self.pause else self.interval):
+                return
+
+            sent = self.command('/pause')
+            delivered = self.api.wait_for('Training suspended', sent, self.timeout)
+            if delivered is None:
+                return
+            self.pause.append(delivered - sent)
+
+            sent = self.command('/continue')
+            delivered = self.api.wait_for('Training continues', sent, self.timeout)
+            if delivered is None:
+                return
+            self.resume.append(delivered - sent)
+
+    def command(self, text):
+        """
+        Send the command to the notifier, return the monotonic time of the sending
+        """
+        if self.webhook is None:
+            return self.api.command(text)
+
+        sent = time.monotonic()
+        post_update(self.webhook, self.api.update(text))
+
+        return sent
+
+    def results(self):
+        return {'pause_ms': percentiles([1000 * i for i in self.pause]),
+                'continue_ms': percentiles([1000 * i for i in self.resume]),
+                'handled': len(self.pause)}
+
+
+def run_loop(name, api, args, loop):
+    """
+    Run the loop(notifier, hook) with the command sender, collect the results
+    """
+    notifier = make_notifier(api, args)
+    commands = Commands(api, args.commands, args.command_delay, args.command_interval, webhook=notifier.webhook)
+    overhead = []  # seconds in the hooks per step, steps which handled the command are excluded
+
+    def hook(function, *hook_args):
+        command = notifier.control.pending
+        start = time.perf_counter()
+        function(*hook_args)
+        elapsed = time.perf_counter() - start
+
+        if not command and not notifier.control.paused:
+            overhead.append(elapsed)
+
+        return elapsed
+
+    commands.start()
+    start = time.perf_counter()
+    try:
+        epochs = loop(notifier, hook)
+    finally:
+        commands.done.set()
+        wall = time.perf_counter() - start
+        notifier.close()
+
+    commands.join(1)
+    sends = {method: api.calls.get(method, 0) for method in SEND_METHODS}
+
+    return {
+        'steps': len(overhead),
+        'overhead_us': {key: 1e6 * value for key, value in percentiles(overhead).items()},
+        'overhead_share': sum(overhead) / wall,
+        'wall_seconds': wall,
+        'api_calls_per_epoch': {method: count / max(epochs, 1) for method, count in sends.items()},
+        'api_calls': dict(api.calls),
+        'injected_failures': dict(api.failures),
+        'edits_saved': notifier.edits_saved,
+        'commands': commands.results(),
+    }
+
+
+def custom_loop(args):
+    """
+    Training loop with the notifier API (as for TF or PyTorch)
+    """
+    def loop(notifier, hook):
+        rng = random.Random(0)
+        policy = ReportPolicy()
+        notifier.reset_run()
+        policy.start(0, max(args.steps // 10, 1))
+        notifier.throughput.start(args.epochs, args.steps, args.batch_size)
+        notifier.message('Training started')
+
+        def after_step(epoch, step):
+            notifier.observe(step, {'loss': rng.random(), 'acc': rng.random()})
+            notifier.throughput.step(step)
+
+            if notifier.control.pending:
+                notifier.handle_commands()
+
+            if notifier.verbose_value and policy.due(step):
+                text = 'Epoch {} / {} \nStep {}'.format(epoch + 1, args.epochs, step)
+                ack = notifier.message(' \n'.join([text] + notifier.throughput.lines()), notifier.cache_message_id)
+                notifier.cache_message_id = ack.message_id
+                policy.fired(step)
+
+        step = 0
+        for epoch in range(args.epochs):
+            notifier.cache_message_id = None
+            for _ in range(args.steps):
+                time.sleep(args.step_time)
+                step += 1
+                hook(after_step, epoch, step)
+
+                if notifier.control.interrupted:
+                    break
+
+        notifier.message('Training completed', priority=PRIORITY_HIGH)
+
+        return args.epochs
+
+    return loop
+
+
+def keras_loop(args):
+    from notifyker.keras import CallbackSimple
+
+    def loop(notifier, hook):
+        rng = random.Random(0)
+        callback = CallbackSimple(notifier=notifier)
+        callback.set_model(SimpleNamespace(stop_training=False))
+        callback.set_params({'epochs': args.epochs, 'steps': None, 'samples': args.steps * args.batch_size,
+                             'batch_size': args.batch_size, 'verbose': 0, 'do_validation': False,
+                             'metrics': ['loss', 'acc']})
+
+        callback.on_train_begin()
+        for epoch in range(args.epochs):
+            callback.on_epoch_begin(epoch, {})
+            for batch in range(args.steps):
+                hook(callback.on_batch_begin, batch, {'batch': batch, 'size': args.batch_size})
+                time.sleep(args.step_time)
+                hook(callback.on_batch_end, batch, {'batch': batch, 'size': args.batch_size,
+                                                    'loss': rng.random(), 'acc': rng.random()})
+
+                if callback.model.stop_training:
+                    break
+
+            callback.on_epoch_end(epoch, {'loss': rng.random(), 'acc': rng.random()})
+
+        callback.on_train_end()
+
+        return args.epochs
+
+    return loop
+
+
+def chainer_loop(args):
+    from notifyker.chainer import ExtensionNotifierReport
+
+    class Iterator:
+        def __init__(self):
+            self._epoch_size = args.steps * args.batch_size
+            self.batch_size = args.batch_size
+
+        def next(self):
+            return None
+
+    class Optimizer:
+        lr = 0.01
+
+        def __repr__(self):
+            return '<chainer.optimizers.SGD object>'
+
+    def loop(notifier, hook):
+        rng = random.Random(0)
+        iterator = Iterator()
+        updater = SimpleNamespace(iteration=0, epoch=0, is_new_epoch=False, _iterators={'main': iterator},
+                                  get_all_optimizers=lambda: {'main': Optimizer()})
+        stop_trigger = SimpleNamespace(period=args.epochs, get_training_length=lambda: (args.epochs, 'epoch'))
+        trainer = SimpleNamespace(updater=updater, stop_trigger=stop_trigger, observation={})
+        extension = ExtensionNotifierReport(notifier)
+
+        while updater.epoch < stop_trigger.period:
+            iterator.next()
+            time.sleep(args.step_time)
+
+            updater.iteration += 1
+            updater.is_new_epoch = updater.iteration % args.steps == 0
+            if updater.is_new_epoch:
+                updater.epoch += 1
+            trainer.observation = {'main/loss': rng.random(), 'main/accuracy': rng.random()}
+
+            hook(extension, trainer)
+
+        return updater.epoch
+
+    return loop
+
+
+LOOPS = {
+    'custom': custom_loop,
+    'keras': keras_loop,
+    'chainer': chainer_loop,
+}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--loops', nargs='+', default=list(LOOPS), choices=list(LOOPS))
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--steps', type=int, default=200, help='steps per epoch')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--step-time', type=float, default=0.01, help='duration of the training step (seconds)')
+    parser.add_argument('--verbose', type=int, default=2, choices=[0, 1, 2])
+    parser.add_argument('--notifier', default='sync', choices=['sync', 'async'],
+                        help='NotifierTelegram or NotifierTelegramAsync (asyncio, aiohttp)')
+    parser.add_argument('--webhook', action='store_true', help='POST the commands to the webhook of the notifier')
+    parser.add_argument('--async-send', action='store_true', help='send messages from the background worker')
+    parser.add_argument('--sync-max-wait', type=float, default=1.0)
+    parser.add_argument('--chat-rate', type=float, default=1.0, help='messages per second per chat')
+    parser.add_argument('--burst', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.05, help='latency of the fake API (seconds)')
+    parser.add_argument('--flood-rate', type=float, default=0.0, help='share of 429 responses')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of 502 responses')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--commands', type=int, default=2, help='number of /pause, /continue rounds')
+    parser.add_argument('--command-delay', type=float, default=1.0, help='seconds before the first /pause')
+    parser.add_argument('--command-interval', type=float, default=1.0)
+    parser.add_argument('--output', help='path of the JSON results')
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.loops:
+        api = FakeTelegramAPI(latency=args.latency, flood_rate=args.flood_rate, error_rate=args.error_rate,
+                              retry_after=args.retry_after).start()
+        try:
+            results[name] = run_loop(name, api, args, LOOPS[name](args))
+        except ImportError as e:
+            results[name] = {'skipped': str(e)}
+        finally:
+            api.close()
+
+    report = {
+        'benchmark': 'notifier_overhead',
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': vars(args),
+        'results': results,
+    }
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    print(text)
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            fh.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
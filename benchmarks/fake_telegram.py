@@ -0,0 +1,245 @@
+"""
+Local stand-in of the telegram bot API for the benchmarks
+
+Implements the methods used by the notifiers: getMe, setWebhook, deleteWebhook, getUpdates (long
+polling), sendMessage, editMessageText, sendPhoto, sendDocument, answerCallbackQuery. Responses of
+sendMessage and editMessageText are delayed by `latency` seconds, a share of them fails with 429
+(flood control) or 502 (network error). Commands are injected as updates of the chat (see command), update builds
+the payload to POST to the webhook of the notifier (see post_update)
+"""
+import itertools
+import json
+import random
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SEND_METHODS = ('sendMessage', 'editMessageText')
+UPLOAD_METHODS = ('sendPhoto', 'sendDocument')
+
+
+class FakeTelegramAPI:
+    """
+    Fake bot API server on localhost
+
+    Args:
+        latency: delay of sendMessage and editMessageText responses (seconds)
+        flood_rate: share of send requests failed with 429
+        error_rate: share of send requests failed with 502
+        retry_after: retry_after of 429 responses (seconds)
+        port: port of the server, 0 - any free port
+        seed: seed of the error injection
+    """
+    def __init__(self, latency=0.0, flood_rate=0.0, error_rate=0.0, retry_after=1, port=0, seed=0):
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+
+        self.calls = {}  # method: number of requests
+        self.failures = {}  # method: number of injected failures
+        self.sent = []  # (monotonic time, method, text) of delivered messages
+        self.uploads = {}  # method: number of delivered files
+
+        self._random = random.Random(seed)
+        self._message_ids = itertools.count(1)
+        self._update_ids = itertools.count(1)
+        self._updates = []
+        self._cond = threading.Condition()
+        self._closed = False
+
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive connections as the bot API
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                api._handle(self, body)
+
+            do_GET = do_POST
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name='fake-telegram', daemon=True)
+
+    @property
+    def base_url(self):
+        """
+        base_url of the notifier
+        """
+        return 'http://127.0.0.1:{}/bot'.format(self.server.server_address[1])
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+        self.server.shutdown()
+        self.server.server_close()
+
+    def update(self, text, chat_id=1):
+        """
+        Update with the message of the chat as telegram sends it (getUpdates or webhook)
+        """
+        command = text.split()[0]
+        entities = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}] if text.startswith('/') else []
+
+        return {
+            'update_id': next(self._update_ids),
+            'message': {
+                'message_id': next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': chat_id, 'is_bot': False, 'first_name': 'benchmark'},
+                'text': text,
+                'entities': entities,
+            },
+        }
+
+    def command(self, text, chat_id=1):
+        """
+        Inject the command message from the chat to getUpdates, return the monotonic time of the injection
+        """
+        update = self.update(text, chat_id)
+
+        with self._cond:
+            self._updates.append(update)
+            self._cond.notify_all()
+
+        return time.monotonic()
+
+    def wait_for(self, text, since, timeout=30):
+        """
+        Wait for the message containing the text delivered after `since` (monotonic), return its time or None
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                for moment, _, sent in self.sent:
+                    if moment >= since and text in sent:
+                        return moment
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._closed:
+                    return None
+
+                self._cond.wait(remaining)
+
+    def _handle(self, request, body):
+        method = request.path.rsplit('/', 1)[-1]
+        try:
+            params = json.loads(body.decode('utf-8')) if body else {}
+        except ValueError:
+            params = {}
+
+        with self._cond:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+        if method == 'getUpdates':
+            self._respond(request, 200, {'ok': True, 'result': self._poll(params)})
+            return
+
+        if method in SEND_METHODS:
+            if self.latency:
+                time.sleep(self.latency)
+
+            failure = self._random.random()
+            if failure < self.flood_rate:
+                self._fail(request, method, 429, {'ok': False, 'error_code': 429,
+                                                  'description': 'Too Many Requests: retry after {}'.format(
+                                                      self.retry_after),
+                                                  'parameters': {'retry_after': self.retry_after}})
+                return
+
+            if failure < self.flood_rate + self.error_rate:
+                self._fail(request, method, 502, {'ok': False, 'error_code': 502, 'description': 'Bad Gateway'})
+                return
+
+        self._respond(request, 200, {'ok': True, 'result': self._result(method, params)})
+
+    def _result(self, method, params):
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'fake', 'username': 'fake_bot'}
+
+        if method in SEND_METHODS:
+            chat_id = int(params.get('chat_id', 1))
+            message_id = int(params.get('message_id') or next(self._message_ids))
+            text = params.get('text', '')
+
+            with self._cond:
+                self.sent.append((time.monotonic(), method, text))
+                self._cond.notify_all()
+
+            return {'message_id': message_id, 'date': int(time.time()),
+                    'chat': {'id': chat_id, 'type': 'private'}, 'text': text}
+
+        if method in UPLOAD_METHODS:
+            # multipart body is not parsed, only the number of files is recorded
+            with self._cond:
+                self.uploads[method] = self.uploads.get(method, 0) + 1
+                self._cond.notify_all()
+
+            return {'message_id': next(self._message_ids), 'date': int(time.time()),
+                    'chat': {'id': 1, 'type': 'private'}}
+
+        return True
+
+    def _poll(self, params):
+        """
+        Long polling: wait for the updates with update_id >= offset not longer than timeout
+        """
+        offset = int(params.get('offset') or 0)
+        deadline = time.monotonic() + float(params.get('timeout') or 0)
+
+        with self._cond:
+            self._updates = [update for update in self._updates if update['update_id'] >= offset]
+
+            while not self._updates and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                self._cond.wait(remaining)
+
+            return list(self._updates)
+
+    def _fail(self, request, method, status, payload):
+        with self._cond:
+            self.failures[method] = self.failures.get(method, 0) + 1
+
+        self._respond(request, status, payload)
+
+    @staticmethod
+    def _respond(request, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+
+        try:
+            request.send_response(status)
+            request.send_header('Content-Type', 'application/json')
+            request.send_header('Content-Length', str(len(data)))
+            request.end_headers()
+            request.wfile.write(data)
+        except OSError:
+            pass
+
+
+def post_update(webhook, update):
+    """
+    POST the update to the running Webhook of the notifier as telegram does, return the HTTP status
+    """
+    request = urllib.request.Request(webhook.local_url, data=json.dumps(update).encode('utf-8'), headers={
+        'Content-Type': 'application/json', 'X-Telegram-Bot-Api-Secret-Token': webhook.secret_token})
+
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return response.status
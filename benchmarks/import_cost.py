@@ -0,0 +1,61 @@
+"""
+Import cost of the bare package: python benchmarks/import_cost.py [--budget-us 20000]
+
+Runs `python -X importtime -c "import notifyker"` in a fresh interpreter and fails (exit code 1)
+if the package imports the heavy dependencies or its cumulative import time exceeds the budget
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# must not be imported by `import notifyker`
+FORBIDDEN = ('telegram', 'keras', 'tensorflow', 'chainer', 'cupy', 'numpy', 'matplotlib', 'aiohttp')
+
+
+def import_times(module):
+    """
+    Return dict of module name: cumulative import time (microseconds) of the modules imported by `import module`
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.environ.get('PYTHONPATH', '')]))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+                            stderr=subprocess.PIPE, env=env, check=True, universal_newlines=True)
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--budget-us', type=int, default=20000, help='max cumulative import time of notifyker (us)')
+    args = parser.parse_args()
+
+    times = import_times('notifyker')
+    forbidden = sorted(name for name in times if name.split('.')[0] in FORBIDDEN)
+    cost = times.get('notifyker', 0)
+
+    print('import notifyker: {} us, {} modules'.format(cost, len(times)))
+
+    errors = []
+    if forbidden:
+        errors.append('heavy modules are imported: {}'.format(', '.join(forbidden)))
+    if cost > args.budget_us:
+        errors.append('import time {} us exceeds the budget {} us'.format(cost, args.budget_us))
+
+    for error in errors:
+        print('FAIL: {}'.format(error))
+
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,19 @@
-from .notifiers import NotifierBase
-from .notifiers import NotifierTelegram
-from .notifiers import NotifierTelegramMenu
-
-
-if __name__ == "__main__":
-    import chainer
-    import keras
+from ._lazy import lazy_attributes
 
 name = 'Notifyker'
 
+# notifiers and integrations are imported on the first access, so `import notifyker`
+# does not import telegram, keras, tensorflow or chainer
+_ATTRIBUTES = {
+    'NotifierBase': '.notifiers.notifier_base',
+    'NotifierTelegram': '.notifiers.notifier_telegram',
+    'NotifierTelegramMenu': '.notifiers.notifier_telegram_menu',
+    'NotifierHubClient': '.hub.client',
+    'CallbackBase': '.keras.callback_base',
+    'CallbackSimple': '.keras.callback_simple',
+    'CallbackSimpleTF': '.tf_keras.callback_simple_tf',
+    'ExtensionNotifierReport': '.chainer.extensions_tg_notifier',
+}
+
+__all__ = list(_ATTRIBUTES)
+__getattr__, __dir__ = lazy_attributes(__name__, _ATTRIBUTES)
@@ -0,0 +1,28 @@
+import importlib
+
+
+def lazy_attributes(package, attributes):
+    """
+    Module-level __getattr__ and __dir__ which import the attributes on the first access
+
+    Args:
+        package: __name__ of the package
+        attributes: dict of attribute name: relative name of the module which defines it
+
+    Return (__getattr__, __dir__) to be assigned in the package
+    """
+    def __getattr__(name):
+        module = attributes.get(name)
+        if module is None:
+            raise AttributeError('module {!r} has no attribute {!r}'.format(package, name))
+
+        value = getattr(importlib.import_module(module, package), name)
+        # the next access does not call __getattr__
+        setattr(importlib.import_module(package), name, value)
+
+        return value
+
+    def __dir__():
+        return sorted(set(vars(importlib.import_module(package))) | set(attributes))
+
+    return __getattr__, __dir__
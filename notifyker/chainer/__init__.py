@@ -1 +1,5 @@
-from .extensions_tg_notifier import ExtensionNotifierReport
+from .._lazy import lazy_attributes
+
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    'ExtensionNotifierReport': '.extensions_tg_notifier',
+})
@@ -1,7 +1,11 @@
 import time
 
+from chainer import Variable
+from chainer.backends import cuda
 from chainer.training import extension
-from chainer.training import trigger as trigger_module
+
+from ..notifiers.notifier_base import PRIORITY_HIGH
+from ..utils import ReportPolicy
 
 
 class ExtensionNotifierReport(extension.Extension):
@@ -12,14 +16,26 @@ class ExtensionNotifierReport(extension.Extension):
     Each interval depending on verbose level this extension collect the observation
     of the trainer and send using telegram API.
 
-    There are two triggers to handle: (1, 'iteration') is used to collect status
-    information for batches and (1, 'epoch') is used to set the status message
+    The extension is called each iteration, but until the report is due (see policy),
+    the epoch ends or the command arrives it only accumulates the observation.
+    At the end of the epoch the status message is set
+
+    Observations are accumulated on the device between the reports, the message shows
+    their mean over the report interval. They are transferred to the host in one batch
+    only when the message is built, so the extension does not synchronize the device
+    on each iteration
+
+    The fetch of the batch (iterator.next of the main iterator) is timed to split the iteration
+    into waiting for the data and the rest of the iteration (see StallDetector). Without the
+    device synchronization the computation queued on the device can be counted as waiting
 
     Args:
         notifier: object of notifier that manage the training and messaging
         custom_metrics: list of functions, which calculate user-specific metrics
+        policy: ReportPolicy of progress reports, by default 10 reports per epoch
+        priority: priority of the extension in the trainer
     """
-    def __init__(self, notifier, custom_metrics=None):
+    def __init__(self, notifier, custom_metrics=None, policy=None, priority=extension.PRIORITY_READER):
         # TODO: additional metrics calculation inside training loop
         if custom_metrics is not None:
             self.custom_metrics = custom_metrics
@@ -33,12 +49,29 @@ class ExtensionNotifierReport(extension.Extension):
         self.details = None  # dict of availble details: epochs, batch_size, lr, etc
         self.starting_time = None
         self.current_epoch = 1
+        self.policy = policy if policy is not None else ReportPolicy()
+        self.priority = priority
 
-        # chainer specific attributes
-        self._trigger_epoch = trigger_module.get_trigger((1, 'epoch'))
-        self._trigger_iteration = trigger_module.get_trigger((1, 'iteration'))
+        # sums and counts of observations since the last report (device arrays are kept on the device)
+        self._summary = {}
+        self._summary_count = {}
 
     def __call__(self, trainer):
+        hook = self.notifier.perf.start()
+        updater = trainer.updater
+        self.notifier.throughput.step(updater.iteration)
+
+        alert = self.notifier.stall.lap()
+        if alert is not None:
+            self.notifier.alert(alert)
+
+        # fast path of the non-reporting iteration
+        if self.details is not None and not (updater.is_new_epoch or self.notifier.control.pending or
+                                             self.policy.due(updater.iteration)):
+            self._accumulate(trainer.observation)
+            self.notifier.perf.stop('batch hook', hook)
+            return
+
         # activate the notifier, connect the bot
         if not self.notifier.active:
             self.notifier._connect()
@@ -47,24 +80,24 @@ class ExtensionNotifierReport(extension.Extension):
         if self.details is None:
             self.start_message(trainer)
 
-        if self._trigger_iteration(trainer):
-            # check notifier flags to react on commands
-            if self.notifier.flags_batch or self.notifier.flags_epoch:
-                self.flags_handler(trainer)
+        self._accumulate(trainer.observation)
 
-            # check the silence mode
-            if self.notifier.verbose_value == 0:
-                return
+        # check notifier commands to react on them
+        if self.notifier.control.pending:
+            self.flags_handler(trainer)
 
-            # send current status and store this message as a acknowledgment
-            if self.notifier.verbose_value != 0:
-                ack = self.status_message(trainer)
+        # send current status, the status of the epoch is prepared even in the silence mode
+        due = self.policy.due(updater.iteration)
+        if updater.is_new_epoch or (due and self.notifier.verbose_value != 0):
+            status = self.status_message(trainer)
+        elif due:
+            self.policy.fired(updater.iteration)
 
-        if self._trigger_epoch(trainer):
+        if updater.is_new_epoch:
             # clear cache id to send next epoch status as a new message
             self.notifier.cache_message_id = None
             # set notifier status for /status command
-            self.notifier._status = ack
+            self.notifier._status = status
             self.current_epoch += 1
 
             # close connection at the end of training
@@ -76,53 +109,129 @@ class ExtensionNotifierReport(extension.Extension):
 
                 self.end_time = time.ctime(int(time.time()))
 
-                self.notifier.message('Training completed {} in {}'.format(tag, self.end_time))
+                self.notifier.message('Training completed {} in {}'.format(tag, self.end_time), priority=PRIORITY_HIGH)
 
                 self.notifier._close_connect()
+                # the next training with the same extension starts with start_message
+                self.details = None
 
     def status_message(self, trainer):
         """
         Prepare the status message and send to the user
         """
-        status = trainer.observation
-        # get the current batch (for current epoch)
-        batch = trainer.updater.iteration % (self.details['samples'] // self.details['batch_size'])
+        start = time.monotonic()
+        updater = trainer.updater
+        if updater.is_new_epoch:
+            self.notifier.throughput.end_epoch()
+
+        # get the current batch (for current epoch), the last batch of the epoch is the full epoch
+        batches = max(self.details['samples'] // self.details['batch_size'], 1)
+        batch = updater.iteration % batches if not updater.is_new_epoch else batches
+
+        message = []
+
+        message.append('Epoch {} / {}'.format(self.current_epoch, self.details['epochs']))
+
+        if self.notifier.verbose_value == 2:
+            # create progress bar, like: [+++==========]
+            filled = min(10 * batch // batches, 10)
+            pad_bar = '[{}{}]'.format('++' * filled, '==' * (10 - filled))
+            message.append('{} / {} {}'.format(min(batch * self.details['batch_size'], self.details['samples']),
+                                               self.details['samples'], pad_bar))
+
+        message.extend(self.notifier.throughput.lines())
 
-        # send the updates only 10 times per epoch iteration_update_freq is used for that
-        if batch % self.iteration_update_freq == 0:
-            message = []
+        status = self._fetch_summary()
+        self.notifier.observe(updater.iteration, status)
+        if updater.is_new_epoch:
+            self.notifier.observe_epoch(self.current_epoch, status)
 
-            message.append('Epoch {} / {}'.format(self.current_epoch, self.details['epochs']))
+        # add loss and acc (or other metrics) and validation loss and acc (at the end of the epoch)
+        for i in status:
+            message.append('{:15s}: {:15s}'.format(i, str(status[i])))
+        if updater.is_new_epoch:
+            message.extend(self.notifier.epoch_spread())
+            message.extend(self.notifier.resource_lines())
+        self.notifier.perf.stop('format', start)
 
-            if self.notifier.verbose_value == 2:
-                # create progress bar, like: [+++==========]
-                pad_bar = '[{}{}]'.format('++' * (batch // self.iteration_update_freq), '==' * (10 - batch // self.iteration_update_freq))
-                message.append('{} / {} {}'.format(batch * self.details['batch_size'], self.details['samples'], pad_bar))
+        # check the silence mode
+        if self.notifier.verbose_value != 0:
+            # ack here is a message id of the sent message, to edit the epoch message
+            ack = self.notifier.message(' \n'.join(message), self.notifier.cache_message_id)
+            self.notifier.cache_message_id = ack.message_id if ack is not None else None
 
-            # add loss and acc (or other metrics) and validation loss and acc (at the end of the epoch)
-            for i in status:
-                message.append('{:15s}: {:15s}'.format(i, str(status[i])))
+        self.policy.fired(updater.iteration, time.monotonic() - start, self.notifier.send_latency)
 
-            # check the silence mode
-            if self.notifier.verbose_value != 0:
-                # ack here is a message id of the sent message, to edit the epoch message
-                ack = self.notifier.message(' \n'.join(message), self.notifier.cache_message_id)
-                self.notifier.cache_message_id = ack.message_id if ack is not None else None
+        return ' \n'.join(message)
 
-            return ' \n'.join(message)
+    def _accumulate(self, observation):
+        """
+        Add observations of the iteration to the summary without the transfer to the host
+        """
+        summary, counts = self._summary, self._summary_count
+        for key, value in observation.items():
+            if isinstance(value, Variable):
+                value = value.array
+
+            if key in summary:
+                summary[key] = summary[key] + value
+                counts[key] += 1
+            else:
+                summary[key] = value
+                counts[key] = 1
+
+    def _fetch_summary(self):
+        """
+        Transfer the accumulated observations to the host (one transfer per device), reset the summary
+
+        Return dict of mean values over the report interval
+        """
+        counts, summary = self._summary_count, self._summary
+        self._summary, self._summary_count = {}, {}
+
+        status = {}
+        on_device = {}  # device id: list of keys
+        for key, value in summary.items():
+            if isinstance(value, cuda.ndarray):
+                on_device.setdefault(value.device.id, []).append(key)
+            else:
+                try:
+                    status[key] = float(value) / counts[key]
+                except (TypeError, ValueError):
+                    continue
+
+        for device_id, keys in on_device.items():
+            with cuda.get_device_from_id(device_id):
+                stacked = cuda.cupy.stack([summary[key].astype('d').mean() for key in keys])
+                values = cuda.to_cpu(stacked)
+
+            for key, value in zip(keys, values):
+                status[key] = float(value) / counts[key]
+
+        # keep the order of the observation
+        return {key: status[key] for key in summary if key in status}
 
     def start_message(self, trainer):
         """
         Send first message about starting parameters and collect initial parameters
         """
-        # initialize the flags of notifier
-        self.notifier.flags_batch = []
-        self.notifier.flags_epoch = []
+        # reset the commands and the status of notifier
+        self.notifier.reset_run()
+        # the observations reach the host only at the reports, as the means of the interval
+        self.notifier.interval_means = True
 
         self.details = {}
+        self.current_epoch = 1
         # calculate the batch status updates frequency - only 10 edits per epoch (avoid spam)
         self.iteration_update_freq = max(trainer.updater._iterators['main']._epoch_size //
                                          trainer.updater._iterators['main'].batch_size // 10, 1)
+        self.policy.start(trainer.updater.iteration, self.iteration_update_freq)
+        iterator = trainer.updater._iterators['main']
+        self.notifier.throughput.start(trainer.stop_trigger.get_training_length()[0],
+                                       -(-iterator._epoch_size // iterator.batch_size), iterator.batch_size,
+                                       trainer.updater.iteration)
+        self.notifier.stall.start()
+        self._time_batches(iterator)
         self.details['epochs'] = trainer.stop_trigger.get_training_length()[0]
         self.details['optimizer'] = trainer.updater.get_all_optimizers()['main'].__repr__().split(' ')[0][1:]
         self.details['lr'] = trainer.updater.get_all_optimizers()['main'].lr
@@ -143,27 +252,34 @@ class ExtensionNotifierReport(extension.Extension):
 
         self.notifier.message(' \n'.join(message))
 
-    def flags_handler(self, trainer):
+    def _time_batches(self, iterator):
         """
-        Handle notifiers flags in order to control the training loop
+        Measure the time of the batch fetch: the updater calls iterator.next, it is replaced on the instance
         """
-        # process pause command
-        if 'p' in self.notifier.flags_batch:
-            self.notifier.flags_batch.remove('p')
-            self.notifier.cache_message_id = None
+        if getattr(iterator, '_notifyker_timed', False):
+            return
+
+        next_batch = iterator.next
+        notifier = self.notifier
+
+        def timed_next():
+            start = time.monotonic()
+            try:
+                return next_batch()
+            finally:
+                notifier.stall.add_wait(time.monotonic() - start)
 
-            self.notifier.message('Training suspended. Use /interrupt or /continue now')
-            # wait for interrupt or continue command
-            while 'c' not in self.notifier.flags_batch and 's' not in self.notifier.flags_batch:
-                time.sleep(10)
+        iterator.next = timed_next
+        iterator._notifyker_timed = True
 
-        # process interrupt command
-        if 's' in self.notifier.flags_batch:
-            self.notifier.flags_batch.remove('s')
+    def flags_handler(self, trainer):
+        """
+        Handle notifier commands in order to control the training loop
+        """
+        # pause is processed inside: wait for interrupt or continue command
+        if self.notifier.handle_commands() == self.notifier.control.INTERRUPTED:
             # some hacking to break the training loop, have no idea how to handle with this better
             trainer.stop_trigger.period = (trainer.updater.epoch - 1) or 1
 
-        # process continue command
-        if 'c' in self.notifier.flags_batch:
-            self.notifier.flags_batch.remove('c')
-            self.notifier.message('Training continues')
+        # the time of the pause is not a part of the training steps
+        self.policy.restart(trainer.updater.iteration)
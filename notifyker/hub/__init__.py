@@ -0,0 +1,2 @@
+from .client import NotifierHubClient
+from .protocol import DEFAULT_SOCKET
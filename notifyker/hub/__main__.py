@@ -0,0 +1,48 @@
+"""
+Notifier hub daemon: python -m notifyker.hub --token TOKEN [--chat-id ID ...] [--socket PATH]
+    [--webhook-url URL --webhook-port PORT --webhook-secret SECRET]
+"""
+import argparse
+
+from ..notifiers.webhook import Webhook
+from .protocol import DEFAULT_SOCKET
+from .server import NotifierHub
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Telegram notifier hub for the training runs of the node')
+    parser.add_argument('--token', required=True, help='telegram bot token')
+    parser.add_argument('--chat-id', type=int, nargs='*', help='chats to send messages (set by /start if omitted)')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='path of the unix socket')
+    parser.add_argument('--proxy-url', default=None, help='proxy of the telegram requests')
+    parser.add_argument('--webhook-url', default=None,
+                        help='public https url of the webhook, the commands are received by the webhook server')
+    parser.add_argument('--webhook-host', default='127.0.0.1', help='address of the webhook server')
+    parser.add_argument('--webhook-port', type=int, default=None,
+                        help='port of the webhook server (enables the webhook without the registration)')
+    parser.add_argument('--webhook-path', default='/webhook', help='path of the webhook')
+    parser.add_argument('--webhook-secret', default=None, help='secret token of the webhook, random by default')
+    args = parser.parse_args()
+
+    webhook = None
+    if args.webhook_url is not None or args.webhook_port is not None:
+        webhook = Webhook(url=args.webhook_url, host=args.webhook_host,
+                          port=args.webhook_port if args.webhook_port is not None else 8443,
+                          path=args.webhook_path, secret_token=args.webhook_secret)
+
+    proxy = {'proxy_url': args.proxy_url} if args.proxy_url else None
+    try:
+        hub = NotifierHub(TOKEN=args.token, PROXY=proxy, chat_id=args.chat_id, socket_path=args.socket,
+                          webhook=webhook)
+    except RuntimeError as e:
+        parser.exit(1, '{}\n'.format(e))
+
+    if webhook is not None:
+        print('Webhook is listening on {}'.format(webhook.local_url))
+
+    print('Notifier hub is listening on {}'.format(args.socket))
+    hub.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+import base64
+import os
+import socket
+import threading
+
+from ..notifiers.notifier_base import NotifierBase
+from ..notifiers.send_queue import Ack, MessageRef
+from .protocol import DEFAULT_SOCKET, decode, encode
+
+
+class NotifierHubClient(NotifierBase):
+    """
+    Notifier which sends messages through the notifier hub (see notifyker.hub.server)
+
+    The hub owns the connection to telegram and routes the commands of the bot to the run
+    by its name. The client only writes messages to the unix socket and receives commands
+    in the thread blocked on the socket, there are no HTTP requests in the training process
+
+    Args:
+        run: name of the run (the hub adds the suffix if the name is taken)
+        socket_path: path of the hub socket
+    """
+    def __init__(self, run=None, socket_path=DEFAULT_SOCKET):
+        super().__init__()
+        self.active = False
+
+        self.run = run if run is not None else 'run-{}'.format(os.getpid())
+        self.socket_path = socket_path
+
+        self._socket = None
+        self._lock = threading.Lock()
+
+        self._connect()
+
+    def _connect(self):
+        if self.active:
+            return
+
+        if self.resources is not None:
+            self.resources.start()
+
+        try:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(self.socket_path)
+        except OSError as e:
+            print('Hub is not available. {}'.format(e))
+            self._socket = None
+            return
+
+        self.active = True
+        self._write(encode(op='register', run=self.run))
+
+        listener = threading.Thread(target=self._listen, args=(self._socket,), name='notifyker-hub', daemon=True)
+        listener.start()
+
+    def message(self, message, message_id=None, priority=None):
+        """
+        Send the message through the hub, return the ack with MessageRef
+        """
+        ref = message_id if isinstance(message_id, MessageRef) else MessageRef()
+        self._write(encode(op='message', text=message, ref=ref.key, priority=priority))
+
+        return Ack(ref)
+
+    def photo(self, image, caption=None):
+        """
+        Send the image (PNG bytes) through the hub
+        """
+        self._write(encode(op='photo', image=base64.b64encode(image).decode('ascii'), caption=caption))
+
+    def document(self, data, filename, caption=None):
+        """
+        Send the file (bytes) through the hub
+        """
+        self._write(encode(op='document', data=base64.b64encode(data).decode('ascii'), filename=filename,
+                           caption=caption))
+
+    def _write(self, data):
+        with self._lock:
+            if not self.active:
+                return
+
+            try:
+                self._socket.sendall(data)
+            except OSError as e:
+                print('Hub is not available. {}'.format(e))
+                self._disconnect()
+
+    def _listen(self, sock):
+        with sock.makefile('rb') as stream:
+            try:
+                for line in stream:
+                    request = decode(line)
+                    if request is not None:
+                        self._handle(request)
+            except OSError:
+                pass
+
+        with self._lock:
+            if self._socket is sock:
+                self._disconnect()
+
+    def _handle(self, request):
+        """
+        Process the request of the hub
+        """
+        if request.get('op') == 'registered':
+            self.run = request['run']
+            return
+
+        if request.get('op') != 'command':
+            return
+
+        command = request.get('command')
+        if command == 'pause':
+            self.control.pause()
+        elif command == 'resume':
+            self.control.resume()
+        elif command == 'interrupt':
+            self.control.interrupt()
+        elif command == 'status':
+            self.status()
+        elif command == 'perf':
+            self.perf_report()
+        elif command == 'plot':
+            self.plot_args((request.get('value') or '').split())
+        elif command == 'export':
+            self.export_args((request.get('value') or '').split())
+        elif command == 'verbose':
+            if request.get('value') is not None:
+                self.verbose_value = int(request['value'])
+
+            self.message('Current verbose: {}'.format(self.verbose_value))
+
+    def _disconnect(self):
+        self.active = False
+
+        if self._socket is not None:
+            try:
+                # wakes up the listener blocked on the socket
+                self._socket.shutdown(socket.SHUT_RDWR)
+                self._socket.close()
+            except OSError:
+                pass
+
+            self._socket = None
+
+    def _close_connect(self):
+        if self.resources is not None:
+            self.resources.stop()
+
+        # the chart being rendered is sent before the disconnection
+        self.charts.close()
+        self.close_logs()
+
+        with self._lock:
+            self._disconnect()
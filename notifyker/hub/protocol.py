@@ -0,0 +1,36 @@
+"""
+Protocol of the notifier hub: JSON objects separated by new lines over the unix socket
+
+Client to hub:
+    {"op": "register", "run": name} - the first request of the connection
+    {"op": "message", "text": text, "ref": key, "priority": priority} - send or edit the message,
+        key identifies the message of the run (edits have the key of the edited message)
+    {"op": "photo", "image": base64, "caption": caption} - send the image (PNG)
+    {"op": "document", "data": base64, "filename": filename, "caption": caption} - send the file
+
+Hub to client:
+    {"op": "registered", "run": name} - name of the run (unique among the runs of the hub)
+    {"op": "command", "command": command, "value": value} - pause, resume, interrupt, status, verbose,
+        perf, plot, export (value is the arguments of /plot, /export)
+"""
+import json
+import os
+import tempfile
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), 'notifyker.sock')
+
+
+def encode(**request):
+    return (json.dumps(request, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def decode(line):
+    """
+    Return the request or None if the line is broken
+    """
+    try:
+        request = json.loads(line.decode('utf-8'))
+    except ValueError:
+        return None
+
+    return request if isinstance(request, dict) else None
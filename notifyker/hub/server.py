@@ -0,0 +1,297 @@
+import base64
+import collections
+import os
+import socket
+import socketserver
+import threading
+
+from telegram.ext import CommandHandler
+
+from ..notifiers.notifier_base import PRIORITY_LOW, PRIORITY_NORMAL
+from ..notifiers.notifier_telegram import NotifierTelegram
+from ..notifiers.send_queue import MessageRef
+from .protocol import DEFAULT_SOCKET, decode, encode
+
+
+class RunSession:
+    """
+    Connection of the run to the hub
+    """
+    REFS_SIZE = 256  # max number of messages of the run which can be edited
+
+    def __init__(self, name, stream):
+        self.name = name
+        self.refs = collections.OrderedDict()  # client key: MessageRef of the hub
+
+        self._stream = stream
+        self._lock = threading.Lock()
+
+    def ref(self, key):
+        """
+        MessageRef of the hub for the message of the client
+
+        Return (ref, edit), edit is True if the message is already known
+        """
+        ref = self.refs.get(key)
+        if ref is not None:
+            return ref, True
+
+        ref = self.refs[key] = MessageRef()
+        if len(self.refs) > self.REFS_SIZE:
+            self.refs.popitem(last=False)
+
+        return ref, False
+
+    def send(self, **request):
+        with self._lock:
+            try:
+                self._stream.write(encode(**request))
+                self._stream.flush()
+            except OSError:
+                pass
+
+
+class _RunHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        hub = self.server.hub
+        session = None
+
+        try:
+            for line in self.rfile:
+                request = decode(line)
+                if request is None:
+                    continue
+
+                if request.get('op') == 'register' and session is None:
+                    session = hub._register(request.get('run') or 'run', self.wfile)
+                elif request.get('op') == 'message' and session is not None:
+                    hub._forward(session, request)
+                elif request.get('op') == 'photo' and session is not None:
+                    hub._forward_photo(session, request)
+                elif request.get('op') == 'document' and session is not None:
+                    hub._forward_document(session, request)
+        except OSError:
+            pass
+        finally:
+            if session is not None:
+                hub._unregister(session)
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class NotifierHub(NotifierTelegram):
+    """
+    Telegram notifier shared by the training runs of the node
+
+    The hub owns the single bot connection and serves NotifierHubClient of each run over
+    the unix socket. Messages of the runs are prefixed by the run name and sent through
+    the queue of the hub (coalesced, rate limited). Commands are routed to the run by the
+    name: /pause run, /continue run, /interrupt run, /status run, /verbose run level, /perf run,
+    /plot run [epochs] [metric ...], /export run [epochs] [first] [last].
+    The name can be omitted if there is the only run. /runs shows the connected runs
+
+    Run it as the daemon: python -m notifyker.hub --token TOKEN
+
+    The socket left by the crashed hub is replaced, RuntimeError is raised if another hub
+    listens on it (two hubs would poll the same bot)
+
+    Args:
+        socket_path: path of the unix socket
+        other arguments are passed to NotifierTelegram, async_send is enabled by default
+    """
+    def __init__(self, TOKEN=None, PROXY=None, chat_id=None, socket_path=DEFAULT_SOCKET, **kwargs):
+        self.socket_path = socket_path
+        self.runs = collections.OrderedDict()  # run name: RunSession
+        self._runs_lock = threading.Lock()
+        self._server = None
+
+        kwargs.setdefault('async_send', True)
+        super().__init__(TOKEN, PROXY, chat_id, **kwargs)
+
+    def _connect(self):
+        if self._server is None:
+            # before the polling: the other hub polls the same bot
+            self._remove_stale_socket()
+
+        super()._connect()
+
+        if self._server is None:
+            self._server = _UnixServer(self.socket_path, _RunHandler)
+            self._server.hub = self
+
+            server = threading.Thread(target=self._server.serve_forever, name='notifyker-hub', daemon=True)
+            server.start()
+
+    def _remove_stale_socket(self):
+        """
+        Remove the socket left on the disk by the crashed hub, raise RuntimeError if the hub is running on it
+        """
+        if not os.path.exists(self.socket_path):
+            return
+
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except ConnectionRefusedError:
+            # nobody listens on it
+            os.unlink(self.socket_path)
+            return
+        except FileNotFoundError:
+            return
+        finally:
+            probe.close()
+
+        raise RuntimeError('Hub is already running on {}'.format(self.socket_path))
+
+    def serve_forever(self):
+        """
+        Block the main thread of the daemon until the interruption
+        """
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def _register(self, name, stream):
+        with self._runs_lock:
+            unique, i = name, 1
+            while unique in self.runs:
+                i += 1
+                unique = '{}#{}'.format(name, i)
+
+            session = self.runs[unique] = RunSession(unique, stream)
+
+        session.send(op='registered', run=unique)
+        self.message('Run {} connected'.format(unique))
+
+        return session
+
+    def _unregister(self, session):
+        with self._runs_lock:
+            if self.runs.get(session.name) is session:
+                del self.runs[session.name]
+
+        self.message('Run {} disconnected'.format(session.name))
+
+    def _forward(self, session, request):
+        """
+        Send the message of the run to telegram
+        """
+        ref, edit = session.ref(request.get('ref'))
+        priority = request.get('priority')
+        if priority is None:
+            priority = PRIORITY_LOW if edit else PRIORITY_NORMAL
+
+        self.message('[{}] {}'.format(session.name, request.get('text', '')), ref, priority=priority)
+
+    def _forward_photo(self, session, request):
+        """
+        Send the image of the run to telegram
+        """
+        try:
+            image = base64.b64decode(request.get('image', ''), validate=True)
+        except ValueError:
+            return
+
+        self.photo(image, '[{}] {}'.format(session.name, request.get('caption') or '').rstrip())
+
+    def _forward_document(self, session, request):
+        """
+        Send the file of the run to telegram
+        """
+        try:
+            data = base64.b64decode(request.get('data', ''), validate=True)
+        except ValueError:
+            return
+
+        self.document(data, '{}_{}'.format(session.name, request.get('filename') or 'file'),
+                      '[{}] {}'.format(session.name, request.get('caption') or '').rstrip())
+
+    def handlers(self):
+        super().handlers()
+        self.updater.dispatcher.add_handler(CommandHandler('runs', self.list_runs))
+
+    def _route(self, update):
+        """
+        Find the run of the command: by the first argument or the only run
+
+        Return (session, remaining arguments), session is None if the run is not found
+        """
+        args = update.message.text.split()[1:] if update is not None else []
+
+        with self._runs_lock:
+            if args and args[0] in self.runs:
+                return self.runs[args[0]], args[1:]
+
+            if len(self.runs) == 1:
+                return next(iter(self.runs.values())), args
+
+        if not self.runs:
+            self.message('There are no runs')
+        else:
+            self.message('Specify the run: {}'.format(', '.join(self.runs)))
+
+        return None, args
+
+    def list_runs(self, bot, update):
+        """
+        Method of runs command processing
+        """
+        self.message('Runs: {}'.format(', '.join(self.runs)) if self.runs else 'There are no runs')
+
+    def status(self, bot=None, update=None):
+        session, _ = self._route(update)
+        if session is not None:
+            session.send(op='command', command='status')
+
+    def pause(self, bot, update):
+        session, _ = self._route(update)
+        if session is not None:
+            session.send(op='command', command='pause')
+
+    def cont(self, bot, update):
+        session, _ = self._route(update)
+        if session is not None:
+            session.send(op='command', command='resume')
+
+    def interrupt(self, bot, update):
+        session, _ = self._route(update)
+        if session is not None:
+            session.send(op='command', command='interrupt')
+            self.message('[{}] Training interrupting...'.format(session.name))
+
+    def verbose(self, bot, update):
+        session, args = self._route(update)
+        if session is not None:
+            value = args[0] if args and args[0] in ('0', '1', '2') else None
+            session.send(op='command', command='verbose', value=value)
+
+    def perf_report(self, bot=None, update=None):
+        session, _ = self._route(update)
+        if session is not None:
+            session.send(op='command', command='perf')
+
+    def plot(self, bot=None, update=None):
+        session, args = self._route(update)
+        if session is not None:
+            session.send(op='command', command='plot', value=' '.join(args))
+
+    def export(self, bot=None, update=None):
+        session, args = self._route(update)
+        if session is not None:
+            session.send(op='command', command='export', value=' '.join(args))
+
+    def close(self, timeout=None):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+        super().close(timeout)
@@ -1,2 +1,6 @@
-from .callback_base import CallbackBase
-from .callback_simple import CallbackSimple
+from .._lazy import lazy_attributes
+
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    'CallbackBase': '.callback_base',
+    'CallbackSimple': '.callback_simple',
+})
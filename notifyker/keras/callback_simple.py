@@ -1,10 +1,20 @@
 import time
 
+from ..notifiers.notifier_base import PRIORITY_HIGH
+from ..utils import ReportPolicy
 from .callback_base import CallbackBase
 
 
 class CallbackSimple(CallbackBase):
-    def __init__(self, notifier=None, custom_metrics=None):
+    """
+    Keras callback to send the results and to control the training using the notifier
+
+    Args:
+        notifier: object of notifier that manage the training and messaging
+        custom_metrics: list of functions, which calculate user-specific metrics
+        policy: ReportPolicy of batch progress reports, by default 10 reports per epoch
+    """
+    def __init__(self, notifier=None, custom_metrics=None, policy=None):
         super().__init__()
 
         if notifier is not None:
@@ -12,18 +22,30 @@ class CallbackSimple(CallbackBase):
         else:
             raise ValueError('Notifier is None')
 
+        self.policy = policy if policy is not None else ReportPolicy()
+        self._step = 0  # number of batches from the beginning of the training
+        self._batch_metrics = []  # metrics reported by the batches
+        self._send_failed = False  # the failure of the message sending is reported once per training
+
     def on_train_begin(self, logs=None):
         if not self.notifier.active:
             self.notifier._connect()
 
-        self.notifier.flags_batch = []
-        self.notifier.flags_epoch = []
+        self.notifier.reset_run()
 
         for i in self.params:
             self.details[i] = self.params[i]
 
         self.starting_time = time.ctime(int(time.time()))
+        self.current_epoch = 1
+        self._send_failed = False
         self.batch_update_freq = max(self.details['samples'] // self.details['batch_size'] // 10, 1)
+        self._step = 0
+        self.policy.start(self._step, self.batch_update_freq)
+        self._batch_metrics = [i for i in self.details['metrics'] if 'val_' not in i]
+        self.notifier.stall.start()
+        self.notifier.throughput.start(self.details['epochs'], -(-self.details['samples'] // self.details['batch_size']),
+                                       self.details['batch_size'])
 
         message = []
         message.append('\nTraining started in {}\n'.format(self.starting_time))
@@ -43,7 +65,7 @@ class CallbackSimple(CallbackBase):
             pass
 
     def on_train_end(self, logs=None):
-        if 's' in self.notifier.flags_batch:
+        if self.notifier.control.interrupted:
             tag = 'forcibly'
         else:
             tag = 'successfully'
@@ -51,48 +73,77 @@ class CallbackSimple(CallbackBase):
         self.end_time = time.ctime(int(time.time()))
 
         try:
-            self.notifier.message('Training completed {} in {}'.format(tag, self.end_time))
+            self.notifier.message('Training completed {} in {}'.format(tag, self.end_time), priority=PRIORITY_HIGH)
         except:
             pass
 
         self.notifier._close_connect()
 
+    def on_batch_begin(self, batch, logs=None):
+        self.notifier.stall.begin()
+
     def on_batch_end(self, batch, logs=None):
-        if self.notifier.flags_batch:
+        try:
+            self._on_batch_end(batch, logs)
+        finally:
+            # the messages and the commands handled after the batch are not the waiting for the data
+            self.notifier.stall.resume()
+
+    def _on_batch_end(self, batch, logs):
+        hook = self.notifier.perf.start()
+        self._step += 1
+        self.notifier.throughput.step(self._step, logs.get('size'))
+
+        alert = self.notifier.stall.end()
+        if alert is not None:
+            self.notifier.alert(alert)
+        self.notifier.observe(self._step, {i: logs[i] for i in self._batch_metrics if i in logs})
+        self.notifier.perf.stop('batch hook', hook)
+
+        if self.notifier.control.pending:
             self.flags_handler()
 
         if self.notifier.verbose_value == 0:
             return
 
-        if batch % self.batch_update_freq == 0:
+        if self.policy.due(self._step):
+            start = time.monotonic()
             message = []
 
             message.append('Epoch {} / {}'.format(self.current_epoch, self.details['epochs']))
 
-            pad_bar = '[{}{}]'.format('++' * (batch // self.batch_update_freq), '==' * (10 - batch // self.batch_update_freq))
-            message.append('{} / {} {}'.format(2 * logs['batch'], self.details['samples'], pad_bar))
+            batches = max(self.details['samples'] // self.details['batch_size'], 1)
+            filled = min(10 * (batch + 1) // batches, 10)
+            pad_bar = '[{}{}]'.format('++' * filled, '==' * (10 - filled))
+            samples = min((batch + 1) * self.details['batch_size'], self.details['samples'])
+            message.append('{} / {} {}'.format(samples, self.details['samples'], pad_bar))
+            message.extend(self.notifier.throughput.lines())
 
             if self.notifier.verbose_value == 2:
                 for i in self.details['metrics']:
                     if 'val_' not in i:
                         message.append('{:15s}: {:15s}'.format(i, str(logs[i])))
+            self.notifier.perf.stop('format', start)
 
-            try:
-                ack = self.notifier.message(' \n'.join(message), self.notifier.cache_message_id)
-                self.notifier.cache_message_id = ack.message_id
-            except Exception as e:
-                pass
+            self._send_progress(message)
+
+            self.policy.fired(self._step, time.monotonic() - start, self.notifier.send_latency)
 
     def on_epoch_begin(self, epoch, logs=None):
-        if self.notifier.flags_epoch:
+        if self.notifier.control.pending:
             self.flags_handler()
 
         self.notifier.cache_message_id = None
+        self.notifier.throughput.begin_epoch()
+        # validation of the previous epoch is not the waiting for the data
+        self.notifier.stall.restart()
 
     def on_epoch_end(self, epoch, logs=None):
-        if self.notifier.flags_epoch:
+        if self.notifier.control.pending:
             self.flags_handler()
 
+        self.notifier.throughput.end_epoch()
+        start = self.notifier.perf.start()
         message = []
 
         message.append('Epoch {} / {}'.format(self.current_epoch, self.details['epochs']))
@@ -101,33 +152,39 @@ class CallbackSimple(CallbackBase):
         message.append('{} / {} {}'.format(self.details['samples'], self.details['samples'], pad_bar))
         for i in logs:
             message.append('{:15s}: {:15s}'.format(i, str(logs[i])))
+        message.extend(self.notifier.throughput.lines())
+        message.extend(self.notifier.epoch_spread())
+        message.extend(self.notifier.resource_lines())
+        self.notifier.perf.stop('format', start)
 
         self.notifier._status = ' \n'.join(message)
+        self.notifier.observe_epoch(self.current_epoch, logs)
 
         if self.notifier.verbose_value != 0:
-            try:
-                ack = self.notifier.message(' \n'.join(message), self.notifier.cache_message_id)
-                self.notifier.cache_message_id = ack.message_id
-            except Exception as e:
-                pass
+            self._send_progress(message)
 
         self.current_epoch += 1
 
-    def flags_handler(self):
+    def _send_progress(self, message):
         """
-        Handle notifiers flags in order to control the training
+        Send (or edit) the progress message, the failure does not stop the training
         """
-        if 'p' in self.notifier.flags_batch:
-            self.notifier.flags_batch.remove('p')
-            self.cache_message_id = None
+        try:
+            ack = self.notifier.message(' \n'.join(message), self.notifier.cache_message_id)
+        except Exception as e:
+            if not self._send_failed:
+                self._send_failed = True
+                print('Progress message is not sent. {}'.format(e))
+            ack = None
 
-            self.notifier.message('Training suspended. Use /interrupt or /continue now')
-            while 'c' not in self.notifier.flags_batch and 's' not in self.notifier.flags_batch:
-                time.sleep(10)
+        self.notifier.cache_message_id = ack.message_id if ack is not None else None
 
-        if 's' in self.notifier.flags_batch:
+    def flags_handler(self):
+        """
+        Handle notifier commands in order to control the training
+        """
+        if self.notifier.handle_commands() == self.notifier.control.INTERRUPTED:
             self.model.stop_training = True
 
-        if 'c' in self.notifier.flags_batch:
-            self.notifier.message('Training continues')
-            self.notifier.flags_batch.remove('c')
+        # the time of the pause is not a part of the training steps
+        self.policy.restart(self._step)
@@ -1,2 +1,16 @@
-from .notifier_base import NotifierBase
-from .notifier_telegram_menu import NotifierTelegram, NotifierTelegramMenu
+from .._lazy import lazy_attributes
+from .control import ControlChannel
+from .delivery import Backoff
+from .notifier_base import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, NotifierBase
+from .rate_limit import RateLimiter
+from .spool import Spool
+from .webhook import Webhook
+
+# telegram notifiers import telegram (aiohttp) on the first access
+_ATTRIBUTES = {
+    'NotifierTelegram': '.notifier_telegram',
+    'NotifierTelegramAsync': '.notifier_telegram_async',
+    'NotifierTelegramMenu': '.notifier_telegram_menu',
+}
+
+__getattr__, __dir__ = lazy_attributes(__name__, _ATTRIBUTES)
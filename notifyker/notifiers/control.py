@@ -0,0 +1,100 @@
+import threading
+
+
+class ControlChannel:
+    """
+    Thread-safe channel of the control commands from the bot to the training loop
+
+    Bot handlers call pause, resume and interrupt. The training loop checks the pending
+    attribute after each batch (single attribute read) and handles the state only when
+    a command arrived. Paused training waits on the event, so resume and interrupt act
+    immediately
+
+    States:
+        running - training is performing
+        paused - training must be suspended
+        interrupted - training must be stopped
+    """
+    RUNNING = 'running'
+    PAUSED = 'paused'
+    INTERRUPTED = 'interrupted'
+
+    def __init__(self):
+        self.state = self.RUNNING
+        self.pending = False  # True if there is the command which is not handled by the training loop
+
+        self._lock = threading.Lock()
+        self._released = threading.Event()  # set while the training is not paused
+        self._released.set()
+
+    @property
+    def paused(self):
+        return self.state == self.PAUSED
+
+    @property
+    def interrupted(self):
+        return self.state == self.INTERRUPTED
+
+    def pause(self):
+        """
+        Suspend the training at the end of the current batch
+        """
+        with self._lock:
+            if self.state != self.RUNNING:
+                return False
+
+            self._released.clear()
+            self.state = self.PAUSED
+            self.pending = True
+
+            return True
+
+    def resume(self):
+        """
+        Continue the suspended training
+        """
+        with self._lock:
+            if self.state != self.PAUSED:
+                return False
+
+            self.state = self.RUNNING
+            self.pending = True
+            self._released.set()
+
+            return True
+
+    def interrupt(self):
+        """
+        Stop the training (also releases the paused training)
+        """
+        with self._lock:
+            self.state = self.INTERRUPTED
+            self.pending = True
+            self._released.set()
+
+            return True
+
+    def acknowledge(self):
+        """
+        Mark the current command as handled, return the current state
+        """
+        self.pending = False
+
+        return self.state
+
+    def wait(self, timeout=None):
+        """
+        Block while the training is paused, return the new state
+        """
+        self._released.wait(timeout)
+
+        return self.state
+
+    def reset(self):
+        """
+        Reset the channel before the new training
+        """
+        with self._lock:
+            self.state = self.RUNNING
+            self.pending = False
+            self._released.set()
@@ -0,0 +1,136 @@
+import random
+import threading
+import time
+
+RETRYABLE = 'retryable'  # network errors and timeouts, the request can be repeated
+FLOOD = 'flood'  # flood control of telegram, the request can be repeated after retry_after seconds
+FATAL = 'fatal'  # the request will not succeed if repeated
+NOT_MODIFIED = 'not_modified'  # edit with the same text, nothing to do
+
+
+def classify(error):
+    """
+    Classify the error of the telegram API request
+    """
+    # telegram is imported only if there is an error, the module is used without it too
+    from telegram.error import BadRequest, NetworkError, RetryAfter, Unauthorized
+
+    if isinstance(error, RetryAfter):
+        return FLOOD
+
+    # BadRequest is a subclass of NetworkError, so it is checked first
+    if isinstance(error, BadRequest):
+        if 'not modified' in str(error).lower():
+            return NOT_MODIFIED
+
+        return FATAL
+
+    if isinstance(error, Unauthorized):
+        return FATAL
+
+    if isinstance(error, NetworkError):
+        return RETRYABLE
+
+    return FATAL
+
+
+class FloodWait(Exception):
+    """
+    The request is not sent: flood control is active longer than the caller can wait
+    """
+    def __init__(self, remaining):
+        super().__init__('Flood control is active for {:.1f}s'.format(remaining))
+        self.remaining = remaining
+
+
+class Backoff:
+    """
+    Exponential backoff with jitter
+
+    Delay of the attempt n is min(cap, base * 2^n) reduced by the random share up to jitter
+
+    Args:
+        retries: max number of retries of the retryable error
+        base: delay of the first retry (seconds)
+        cap: max delay (seconds)
+        jitter: max share of the delay randomly subtracted (0 - no jitter, 1 - full jitter)
+    """
+    def __init__(self, retries=5, base=0.5, cap=30.0, jitter=0.5):
+        self.retries = retries
+        self.base = base
+        self.cap = cap
+        self.jitter = jitter
+
+    def delay(self, attempt):
+        delay = min(self.cap, self.base * 2 ** attempt)
+
+        return delay * (1 - self.jitter * random.random())
+
+
+class FloodGate:
+    """
+    Shared state of the telegram flood control: no requests are sent until it is over
+    """
+    def __init__(self):
+        self._until = 0.0
+        self._lock = threading.Lock()
+
+    def hold(self, seconds):
+        with self._lock:
+            self._until = max(self._until, time.monotonic() + seconds)
+
+    def remaining(self):
+        return max(self._until - time.monotonic(), 0.0)
+
+
+def deliver(request, backoff, flood, max_wait=None):
+    """
+    Perform the request with retries
+
+    Retryable errors are repeated with the backoff, flood control errors after retry_after
+    seconds, fatal errors are raised. If the flood control is active the request waits
+    for its end instead of hitting the API
+
+    Args:
+        request: function without arguments which performs the API request and returns the ack
+        backoff: Backoff of retryable errors
+        flood: FloodGate shared by the requests of the notifier
+        max_wait: max total time to sleep (seconds), None - unlimited. FloodWait is raised if
+            the flood control is longer, the last error is raised if retries are longer
+
+    Return the ack of the request or None if the message is not modified
+    """
+    slept = 0.0
+    attempt = 0
+
+    while True:
+        remaining = flood.remaining()
+        if remaining > 0:
+            if max_wait is not None and slept + remaining > max_wait:
+                raise FloodWait(remaining)
+
+            time.sleep(remaining)
+            slept += remaining
+
+        try:
+            return request()
+        except Exception as e:
+            kind = classify(e)
+
+            if kind == NOT_MODIFIED:
+                return None
+
+            if kind == FLOOD:
+                flood.hold(e.retry_after)
+                continue
+
+            if kind != RETRYABLE or attempt >= backoff.retries:
+                raise
+
+            delay = backoff.delay(attempt)
+            if max_wait is not None and slept + delay > max_wait:
+                raise
+
+            time.sleep(delay)
+            slept += delay
+            attempt += 1
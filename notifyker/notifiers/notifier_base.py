@@ -1,3 +1,27 @@
+import atexit
+import os
+import threading
+import time
+
+from ..utils.history import MetricHistory, format_summary
+from ..utils.metric_log import MetricLog
+from ..utils.perf import PerfStats
+from ..utils.plot import ChartRenderer, history_panels
+from ..utils.resources import ResourceSampler
+from ..utils.sketch import SketchSet
+from ..utils.stall import StallDetector
+from ..utils.throughput import ThroughputMeter
+from ..utils.watchdog import DivergenceMonitor
+from .control import ControlChannel
+
+# priorities of messages: the end of training and errors, regular messages, progress edits
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+EXPORT_LIMIT = 50 * 2 ** 20  # max size of the file sent by the bot
+
+
 class NotifierBase:
     """
     Abstract class for notifiers
@@ -8,28 +32,355 @@ class NotifierBase:
         Initialize mandatory variables of notifier
         """
         self.cache_message_id = None  # use to edit messages
-        self.flags_batch = []  # use to implement operations after each batch
-        self.flags_epoch = []  # use to implement operations after each epoch
+        self.control = ControlChannel()  # commands to control the training loop
         self._status = None  # store status
         self.verbose_value = 1
+        self.send_latency = None  # average round trip time of the message sending (seconds)
+
+        self.history = MetricHistory()  # metrics reported by the training steps
+        self.epoch_history = MetricHistory()  # metrics of the epochs
+        self.status_windows = (100, None)  # windows (steps) of the history in the status, None - the whole run
+        self.sketches = SketchSet()  # spread of the step metrics within the current epoch
+        self.interval_means = False  # observe receives the means of the report intervals, not the step values
+        self.monitor = DivergenceMonitor()  # rules of the wasted run (None - disabled)
+        self.throughput = ThroughputMeter()  # speed of the training and ETA
+        self.stall = StallDetector()  # waiting for the input data
+        self.resources = None  # ResourceSampler of the host (see sample_resources)
+        self.perf = PerfStats()  # self-instrumentation, NULL_PERF disables it
+        self.charts = ChartRenderer()  # charts of the history rendered in the worker process
+        self.epoch_chart = False  # send the chart of the epoch metrics at the end of each epoch
+        self.metric_log = None  # MetricLog of every step on the disk (see log_metrics)
+        self.epoch_log = None  # MetricLog of the epochs
 
-    def status(self):
+    def observe(self, step, metrics):
         """
-        Status message update
+        Record metrics (dict of name: number) of the training step
+        """
+        start = self.perf.start()
+
+        self.history.record(step, metrics)
+        self.sketches.update(metrics)
+        if self.metric_log is not None:
+            self.metric_log.record(step, metrics)
+
+        if self.monitor is not None:
+            for alert in self.monitor.check(step, metrics):
+                self.alert(alert, self.monitor.stop)
+
+        self.perf.stop('observe', start)
+
+    def observe_epoch(self, epoch, metrics):
+        """
+        Record metrics (dict of name: number) of the epoch
+        """
+        self.epoch_history.record(epoch, metrics)
+        if self.epoch_log is not None:
+            self.epoch_log.record(epoch, metrics)
+
+        if self.monitor is not None:
+            for alert in self.monitor.check_epoch(epoch, metrics):
+                self.alert(alert, self.monitor.stop)
+
+        if self.epoch_chart:
+            self.send_chart(epochs=True, caption='Epoch {}'.format(epoch))
+
+    def alert(self, text, stop=False):
+        """
+        Send the alert, interrupt the training if stop is set (as /interrupt does)
+        """
+        if stop and self.control.interrupt():
+            text += '\nTraining interrupting...'
+
+        self.message(text, priority=PRIORITY_HIGH)
+
+    def sample_resources(self, interval=5.0, size=60):
+        """
+        Start the background sampler of the host resources, its last sample is added to /status and epoch messages
+        """
+        if self.resources is None:
+            self.resources = ResourceSampler(interval, size)
+
+        self.resources.start()
+
+        return self.resources
+
+    def log_metrics(self, directory, buffer_size=4096):
+        """
+        Write every reported metric to the columnar logs in the directory: steps/ and epochs/ (see MetricLog)
+        """
+        if self.metric_log is None:
+            self.metric_log = MetricLog(os.path.join(directory, 'steps'), buffer_size)
+            self.epoch_log = MetricLog(os.path.join(directory, 'epochs'), buffer_size)
+            # the buffered rows are written if the training fails
+            atexit.register(self.close_logs)
+
+        return self.metric_log
+
+    def close_logs(self):
+        """
+        Write the buffered rows of the metric logs and close the files
+        """
+        for log in (self.metric_log, self.epoch_log):
+            if log is not None:
+                log.close()
+
+    def resource_lines(self):
+        """
+        Lines of the message with the host resources, empty if they are not sampled
+        """
+        return self.resources.lines() if self.resources is not None else []
+
+    def epoch_spread(self):
+        """
+        Lines of the epoch message with the spread of the step metrics within the epoch, reset it for the next epoch
+        """
+        lines = self.sketches.lines()
+        self.sketches.reset()
+
+        return [self._spread_title('Within the epoch')] + lines if lines else []
+
+    def _spread_title(self, title):
+        # the spread of the means is narrower than the spread of the steps, a NaN step is hidden in its mean
+        return '{} (interval means):'.format(title) if self.interval_means else '{}:'.format(title)
+
+    def status_text(self):
+        """
+        Status message: the last epoch and the trend of the metrics
         """
         if self._status is None:
-            text = 'Status undefined. Probably, first epoch is still performing'
+            message = ['Status undefined. Probably, first epoch is still performing']
         else:
-            text = self._status
+            message = [self._status]
+
+        message.extend(self.throughput.lines())
+        message.extend(self.stall.lines())
+        message.extend(self.resource_lines())
+
+        lines = self.sketches.lines()
+        if lines:
+            message.append(self._spread_title('Current epoch'))
+            message.extend(lines)
+
+        for window in self.status_windows:
+            summary = self.history.summary(window)
+            if summary:
+                title = 'Last {} steps:'.format(window) if window is not None else 'Whole run:'
+                message.extend(format_summary(summary, title))
 
-        self.message(text)
+        return ' \n'.join(message)
 
-    def message(self, message, message_id=None):
+    def status(self, bot=None, update=None):
+        """
+        Status message update
+        """
+        self.message(self.status_text())
+
+    def chart(self, names=None, epochs=False):
+        """
+        Return the Future of PNG bytes with the curves of the metrics (all by default), None if there are no values
+
+        The curves of the steps or of the epochs (epochs=True) are rendered in the worker process,
+        the image is cached by the metrics and the version of the history
+        """
+        history = self.epoch_history if epochs else self.history
+        names = tuple(names or ())
+        key = (epochs, names, history.version)
+
+        future = self.charts.cached(key)
+        if future is not None:
+            return future
+
+        panels = history_panels(history, names)
+        if not panels:
+            return None
+
+        return self.charts.render(key, panels, xlabel='epoch' if epochs else 'step')
+
+    def send_chart(self, names=None, epochs=False, caption=None):
+        """
+        Render the chart (see chart) and send it when it is ready, the caller does not wait for the rendering
+        """
+        future = self.chart(names, epochs)
+        if future is None:
+            self.message('There are no values to plot')
+            return
+
+        def send(future):
+            # the renderer is closed before the chart is rendered
+            if future.cancelled():
+                return
+
+            try:
+                image = future.result()
+            except Exception as e:
+                self.message(str(e))
+                return
+
+            self.photo(image, caption)
+
+        future.add_done_callback(send)
+
+    def plot(self, bot=None, update=None):
+        """
+        Chart command processing: /plot [epochs] [metric ...]
+        """
+        self.plot_args(update.message.text.split()[1:] if update is not None else [])
+
+    def plot_args(self, args):
+        """
+        Send the chart of the arguments of /plot: [epochs] [metric ...]
+        """
+        epochs = bool(args) and args[0] == 'epochs'
+
+        self.send_chart(args[1:] if epochs else args, epochs)
+
+    def export(self, bot=None, update=None):
+        """
+        Export command processing: /export [epochs] [first step] [last step]
+        """
+        self.export_args(update.message.text.split()[1:] if update is not None else [])
+
+    def export_args(self, args):
+        """
+        Send the compressed slice of the metric log for the arguments of /export: [epochs] [first step] [last step]
+
+        The slice is read and compressed in the background thread
+        """
+        epochs = bool(args) and args[0] == 'epochs'
+        if epochs:
+            args = args[1:]
+
+        try:
+            bounds = [int(arg) for arg in args[:2]]
+        except ValueError:
+            self.message('Usage: /export [epochs] [first step] [last step]')
+            return
+
+        log = self.epoch_log if epochs else self.metric_log
+        if log is None:
+            self.message('Metrics are not logged')
+            return
+
+        first, last = (bounds + [None, None])[:2]
+        name = 'epochs' if epochs else 'steps'
+        thread = threading.Thread(target=self._export, args=(log, first, last, name), name='notifyker-export',
+                                  daemon=True)
+        thread.start()
+
+    def _export(self, log, first, last, name):
+        try:
+            log.flush()
+            # the steps of the previous runs overlap with the current one
+            data = log.reader().export(first, last, run=-1)
+        except (OSError, ValueError) as e:
+            self.message('Metrics are not exported. {}'.format(e))
+            return
+
+        if len(data) > EXPORT_LIMIT:
+            self.message('Export is larger than {}MB, choose the shorter range'.format(EXPORT_LIMIT // 2 ** 20))
+            return
+
+        bounds = '{}-{}'.format('' if first is None else first, '' if last is None else last)
+        self.document(data, '{}{}.npz'.format(name, '' if bounds == '-' else '_' + bounds),
+                      'Metrics of the {}, load with numpy.load'.format(name))
+
+    def perf_text(self):
+        """
+        Message with the overhead of the notifier: timers of the training thread, counters, gauges
+        """
+        if not self.perf.enabled:
+            return 'Instrumentation is disabled'
+
+        lines = self.perf.lines()
+        if self.charts.rendered or self.charts.hits:
+            lines.append('charts: {} rendered, {} from cache'.format(self.charts.rendered, self.charts.hits))
+        if self.send_latency is not None:
+            lines.append('send latency: {:.0f}ms'.format(self.send_latency * 1e3))
+
+        return ' \n'.join(['Notifier overhead:'] + lines)
+
+    def perf_report(self, bot=None, update=None):
+        """
+        Send the overhead of the notifier
+        """
+        self.message(self.perf_text())
+
+    def message(self, message, message_id=None, priority=None):
         """
         Abstract method of message sending
         Method must be redefined with the return variable ack (can be None, used to edit message of batches)
+        Priority is one of PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW (None - defined by notifier)
         """
         pass
-    
-    def _close_connect(self):
+
+    def photo(self, image, caption=None):
+        """
+        Abstract method of image (PNG bytes) sending, it is called from the thread of the charts
+        """
         pass
+
+    def document(self, data, filename, caption=None):
+        """
+        Abstract method of file (bytes) sending, it is called from the background thread
+        """
+        pass
+
+    def _measure_latency(self, seconds, smoothing=0.3):
+        """
+        Update the average round trip time of the message sending
+        """
+        if self.send_latency is None:
+            self.send_latency = seconds
+        else:
+            self.send_latency += smoothing * (seconds - self.send_latency)
+
+    def reset_run(self):
+        """
+        Reset the state of the run before the new training
+        """
+        self.control.reset()
+        self.cache_message_id = None
+        self._status = None
+        self.history.clear()
+        self.epoch_history.clear()
+        self.sketches.reset()
+        self.interval_means = False
+        # the logs keep the previous runs, their steps are told apart by the run
+        for log in (self.metric_log, self.epoch_log):
+            if log is not None:
+                log.new_run()
+        if self.monitor is not None:
+            self.monitor.reset()
+        self.perf.reset()
+
+    def handle_commands(self):
+        """
+        Handle control commands inside the training loop (call it if control.pending is set)
+
+        Paused training is blocked here until /continue or /interrupt
+        Return the state of the training: ControlChannel.RUNNING or ControlChannel.INTERRUPTED
+        """
+        state = self.control.acknowledge()
+        paused = time.monotonic()
+        self.perf.count('commands')
+
+        while state == ControlChannel.PAUSED:
+            self.cache_message_id = None
+            self.message('Training suspended. Use /interrupt or /continue now')
+
+            self.control.wait()
+            state = self.control.acknowledge()
+
+            if state == ControlChannel.RUNNING:
+                self.message('Training continues')
+
+        # the time of the pause is not a part of the training speed
+        paused = time.monotonic() - paused
+        self.throughput.exclude(paused)
+        self.perf.record('pause', paused)
+        self.stall.restart()
+
+        return state
+
+    def _close_connect(self):
+        self.close_logs()
@@ -1,49 +1,343 @@
+import atexit
+import collections
+import io
+import os
+import threading
+import time
+import weakref
+
+from telegram import Update
 from telegram.ext import CommandHandler, Updater
 
-from .notifier_base import NotifierBase
+from .delivery import FATAL, FLOOD, RETRYABLE, Backoff, FloodGate, FloodWait, classify, deliver
+from .notifier_base import PRIORITY_LOW, PRIORITY_NORMAL, NotifierBase
+from .rate_limit import RateLimiter
+from .send_queue import Ack, MessageRef, SendJob, SendQueue
+
+
+NO_RETRY = Backoff(retries=0)
 
 
 class NotifierTelegram(NotifierBase):
     """
     Telegram notifier bot
+
+    Messages are sent to all subscribed chats (chat_ids), the text is formatted once.
+    Requests are limited by the token buckets of the chat and of the bot (see RateLimiter),
+    message returns the ack with MessageRef, which holds the id of the message in each chat
+
+    In the asynchronous mode (async_send=True) messages are put into the bounded queue
+    and are sent by the background worker, so the training thread does not wait for the
+    telegram API. The worker fills in the ids of MessageRef when the message is delivered.
+    The end of training and errors are delivered before the other messages, progress
+    edits are delivered last
+
+    Edits which do not change the text of the message are not sent (telegram rejects
+    them anyway), the queue collapses pending edits of the same message. Number of
+    saved edits is available as edits_saved
+
+    Requests failed due to network errors are retried with the exponential backoff, flood
+    control errors are retried after retry_after, no requests are sent while the flood
+    control is active. The worker waits as long as required, the training thread (without
+    async_send) sleeps not longer than sync_max_wait and then drops the message
+
+    With the spool messages which are not delivered due to the connection (or flood control)
+    are written to the disk, they are replayed in order when the connection returns (also
+    after the restart of the process). Progress edits are replayed as the final state only
+
+    With the webhook (see Webhook) commands are received by the embedded HTTP server instead
+    of the long polling, they are handled within the request of telegram
+
+    The persistent session is not closed at the end of training: the bot and its handlers
+    stay alive for the next fit, only the state of the run is reset. It is closed by close
+    or at the exit of the interpreter, in both cases not longer than shutdown_timeout
+
+    Args:
+        TOKEN: telegram bot token
+        PROXY: request_kwargs of the telegram Updater
+        chat_id: id of the chat to send messages or list of ids (set by /start if None)
+        async_send: send messages from the background worker
+        queue_size: max number of queued messages
+        overflow: queue overflow policy - 'drop_oldest', 'block' or 'coalesce'
+        flush_timeout: max time (seconds) to deliver queued messages on the connection close
+        backoff: Backoff of retryable errors
+        sync_max_wait: max time (seconds) to wait for retries on the training thread
+        spool: Spool of undelivered messages
+        rate_limiter: RateLimiter of requests, by default 1 message per second per chat and 30 per second per bot
+        persistent: keep the connection after the end of training
+        shutdown_timeout: max time (seconds) to close the connection
+        base_url: url of the bot API (the token is appended), e.g. of the local API server, official by default
+        webhook: Webhook which receives the commands, None - long polling
     """
-    def __init__(self, TOKEN=None, PROXY=None, chat_id=None):
+    DELIVERED_CACHE_SIZE = 64
+    SYNC_REPLAY_LIMIT = 5  # max number of spooled messages replayed by the training thread at once
+
+    def __init__(self, TOKEN=None, PROXY=None, chat_id=None, async_send=False, queue_size=100,
+                 overflow='drop_oldest', flush_timeout=5, backoff=None, sync_max_wait=1.0,
+                 spool=None, rate_limiter=None, persistent=False, shutdown_timeout=10, base_url=None,
+                 webhook=None):
         """
         Create handlers and chat id for message edits
         """
         super().__init__()
         self.active = False
 
-        self.chat_id = chat_id
+        self.chat_ids = []  # subscribed chats
+        for i in (chat_id if isinstance(chat_id, (list, tuple)) else [chat_id]):
+            self.subscribe(i)
+
         self.__TOKEN = TOKEN
         self.__PROXY = PROXY
+        self.base_url = base_url
+        self.webhook = webhook
+
+        self.flush_timeout = flush_timeout
+        self.persistent = persistent
+        self.shutdown_timeout = shutdown_timeout
+        self.send_queue = SendQueue(self._deliver, queue_size, overflow) if async_send else None
+
+        self.backoff = backoff if backoff is not None else Backoff()
+        self.sync_max_wait = sync_max_wait
+        self.flood = FloodGate()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+
+        self.spool = spool
+        self._spool_session = '{}-{}'.format(os.getpid(), int(time.time()))
+        self._spooled_refs = weakref.WeakValueDictionary()  # spool key: reference of the spooled message
+
+        self.skipped_edits = 0  # edits with the text which is already delivered
+        self._delivered = collections.OrderedDict()  # (chat id, message id): hash of the last delivered text
 
         self._connect()
 
+        if persistent:
+            atexit.register(self.close)
+
+    @property
+    def chat_id(self):
+        """
+        The first subscribed chat
+        """
+        return self.chat_ids[0] if self.chat_ids else None
+
+    @chat_id.setter
+    def chat_id(self, chat_id):
+        self.subscribe(chat_id)
+
+    def subscribe(self, chat_id):
+        """
+        Send messages to the chat too
+        """
+        if chat_id is not None and chat_id not in self.chat_ids:
+            self.chat_ids.append(chat_id)
+
+    def unsubscribe(self, chat_id):
+        if chat_id in self.chat_ids:
+            self.chat_ids.remove(chat_id)
+
     def _connect(self):
         if not self.active:
-            self.updater = Updater(self.__TOKEN, request_kwargs=self.__PROXY)
+            self.updater = Updater(self.__TOKEN, base_url=self.base_url, request_kwargs=self.__PROXY)
 
             self.handlers()
-            self.updater.start_polling()
+            if self.webhook is not None:
+                self._start_webhook()
+            else:
+                self.updater.start_polling()
+
+            if self.send_queue is not None:
+                self.send_queue.start()
+
+            if self.resources is not None:
+                self.resources.start()
 
             self.active = True
 
-    def message(self, message, message_id=None, reply_markup=None):
+    def _start_webhook(self):
+        """
+        Start the server of the webhook, register it if the url is set
+        """
+        self.webhook.start(self._process_update)
+
+        if self.webhook.url is not None:
+            try:
+                self.updater.bot.set_webhook(url=self.webhook.url, secret_token=self.webhook.secret_token)
+            except Exception as e:
+                print('Webhook is not registered. {}'.format(e))
+
+    def _process_update(self, data):
+        """
+        Dispatch the update received by the webhook to the handlers
+        """
+        self.updater.dispatcher.process_update(Update.de_json(data, self.updater.bot))
+
+    def message(self, message, message_id=None, reply_markup=None, priority=None):
         """
         Telegram specific method of message sending
+
+        By default priority of edits is low, priority of new messages is normal
         """
-        try:
-            if message_id is not None:
-                ack = self.updater.bot.edit_message_text(chat_id=self.chat_id, text=message, message_id=message_id)
-            else:
-                ack = self.updater.bot.send_message(chat_id=self.chat_id, text=message, reply_markup=reply_markup)
-        except Exception as e:
-            print('Chat is not active. {}'.format(e))
-            return None
+        ref = message_id if isinstance(message_id, MessageRef) else MessageRef(message_id, self.chat_id)
+        if priority is None:
+            priority = PRIORITY_LOW if message_id is not None else PRIORITY_NORMAL
+
+        start = self.perf.start()
+        if self.send_queue is not None and self.send_queue.put(SendJob(message, ref, reply_markup, priority)):
+            self.perf.gauge('queue depth', len(self.send_queue))
+        else:
+            # without the queue or its worker (not started yet or stopped by close)
+            self._dispatch(message, ref, reply_markup, self.sync_max_wait, self.SYNC_REPLAY_LIMIT)
+        self.perf.stop('send', start)
+
+        return Ack(ref)
+
+    def _dispatch(self, text, ref, reply_markup=None, max_wait=None, replay_limit=None):
+        """
+        Send the message (or edit it) in each subscribed chat, fill in the ids of the reference
+
+        Deliveries failed due to the connection are spooled, the other failures are reported
+        """
+        for chat_id in list(self.chat_ids):
+            # keep the order: new messages wait in the spool until the spooled ones are replayed
+            if self.spool is not None and self.spool.pending and not self._replay(replay_limit, max_wait):
+                self._to_spool(ref, text, chat_id)
+                continue
+
+            message_id = ref.message_ids.get(chat_id)
+            try:
+                ack = self._send(text, chat_id, message_id, reply_markup, max_wait)
+            except Exception as e:
+                if self._spoolable(e):
+                    self._to_spool(ref, text, chat_id)
+                    continue
+
+                print('Chat {} is not active. {}'.format(chat_id, e))
+                # the next edit sends the new message if this one can not be edited
+                if message_id is not None and classify(e) == FATAL:
+                    ref.message_ids.pop(chat_id, None)
+
+                continue
+
+            if message_id is None:
+                ref.message_ids[chat_id] = ack.message_id
+
+    def _send(self, message, chat_id, message_id=None, reply_markup=None, max_wait=None, retry=True):
+        """
+        Send new message or edit the existing one in the chat with retries, return telegram ack
+        """
+        digest = hash(message)
+
+        if message_id is not None:
+            if self._delivered.get((chat_id, message_id)) == digest:
+                self.skipped_edits += 1
+                return Ack(message_id)
 
+            def request():
+                return self.updater.bot.edit_message_text(chat_id=chat_id, text=message, message_id=message_id)
         else:
-            return ack
+            def request():
+                return self.updater.bot.send_message(chat_id=chat_id, text=message, reply_markup=reply_markup)
+
+        if not self.rate_limiter.acquire(chat_id, max_wait):
+            raise FloodWait(max_wait)
+
+        start = time.monotonic()
+        ack = deliver(request, self.backoff if retry else NO_RETRY, self.flood, max_wait)
+        self._measure_latency(time.monotonic() - start)
+
+        # telegram rejected the edit with the same text
+        if ack is None:
+            ack = Ack(message_id)
+
+        key = (chat_id, getattr(ack, 'message_id', message_id))
+        self._delivered[key] = digest
+        self._delivered.move_to_end(key)
+        # only recent messages are edited, keep the cache small
+        if len(self._delivered) > self.DELIVERED_CACHE_SIZE:
+            self._delivered.popitem(last=False)
+
+        return ack
+
+    def photo(self, image, caption=None):
+        """
+        Send the image (PNG bytes) to each subscribed chat, called from the thread of the charts
+        """
+        self._upload(self.updater.bot.send_photo, 'photo', image, caption=caption)
+
+    def document(self, data, filename, caption=None):
+        """
+        Send the file (bytes) to each subscribed chat
+        """
+        self._upload(self.updater.bot.send_document, 'document', data, filename=filename, caption=caption)
+
+    def _upload(self, method, field, data, **kwargs):
+        """
+        Upload the file to each subscribed chat with the bot method, waiting for the rate limits
+        """
+        for chat_id in list(self.chat_ids):
+            def request():
+                # the file is read by each attempt
+                return method(chat_id=chat_id, **{field: io.BytesIO(data)}, **kwargs)
+
+            try:
+                self.rate_limiter.acquire(chat_id)
+                deliver(request, self.backoff, self.flood)
+            except Exception as e:
+                print('Chat {} is not active. {}'.format(chat_id, e))
+
+    @property
+    def edits_saved(self):
+        """
+        Number of edits which were not sent: collapsed in the queue or with the unchanged text
+        """
+        coalesced = self.send_queue.coalesced if self.send_queue is not None else 0
+
+        return coalesced + self.skipped_edits
+
+    def perf_text(self):
+        """
+        Message with the overhead of the notifier and the state of the delivery
+        """
+        lines = [super().perf_text()]
+        if self.send_queue is not None:
+            lines.append('queue: {} pending, {} dropped, {} coalesced'.format(
+                len(self.send_queue), self.send_queue.dropped, self.send_queue.coalesced))
+        lines.append('skipped edits: {}'.format(self.skipped_edits))
+        if self.spool is not None:
+            lines.append('spool: {} discarded'.format(self.spool.discarded))
+
+        return ' \n'.join(lines)
+
+    def _deliver(self, job):
+        """
+        Send the queued job (worker thread)
+        """
+        self._dispatch(job.text, job.ref, job.reply_markup)
+
+    def _spoolable(self, error):
+        """
+        Check if the message failed with the error can be delivered later
+        """
+        return self.spool is not None and (isinstance(error, FloodWait) or classify(error) in (RETRYABLE, FLOOD))
+
+    def _to_spool(self, ref, text, chat_id):
+        key = '{}-{}-{}'.format(self._spool_session, ref.key, chat_id)
+        self._spooled_refs[key] = ref
+        self.spool.append(key, text, chat_id)
+
+    def _replay(self, limit=None, max_wait=None):
+        """
+        Send spooled messages, return True if all of them are delivered
+        """
+        def send(key, text, chat_id):
+            # single attempt: the connection is probably still lost
+            ack = self._send(text, chat_id, max_wait=max_wait, retry=False)
+
+            ref = self._spooled_refs.pop(key, None)
+            if ref is not None:
+                ref.message_ids[chat_id] = ack.message_id
+
+        return self.spool.replay(send, limit)
 
     def handlers(self):
         """
@@ -56,6 +350,9 @@ class NotifierTelegram(NotifierBase):
         self.updater.dispatcher.add_handler(CommandHandler('pause', self.pause))
         self.updater.dispatcher.add_handler(CommandHandler('verbose', self.verbose))
         self.updater.dispatcher.add_handler(CommandHandler('continue', self.cont))
+        self.updater.dispatcher.add_handler(CommandHandler('perf', self.perf_report))
+        self.updater.dispatcher.add_handler(CommandHandler('plot', self.plot))
+        self.updater.dispatcher.add_handler(CommandHandler('export', self.export))
 
     def start(self, bot, update):
         """
@@ -79,22 +376,25 @@ class NotifierTelegram(NotifierBase):
 /status - Show current training status - epoch, metrics\n\
 /pause - Suspend training process (model still in a memory)\n\
 /continue - Continue training process\n\
-/interrupt - Interrupt training process ATTENTION: You will not be able to continue by this bot\n'
+/interrupt - Interrupt training process ATTENTION: You will not be able to continue by this bot\n\
+/plot - Chart of the metrics: /plot [epochs] [metric ...]\n\
+/export - Logged metrics (npz): /export [epochs] [first step] [last step]\n\
+/perf - Show overhead of the notifier\n'
         self.message(message)
 
     def pause(self, bot, update):
         """
         Method of pause command processing. Suspend the training process
         """
-        # add 'p' flag to suspend the training in the end of the current batch
-        self.flags_batch.append('p')
+        # suspend the training in the end of the current batch
+        self.control.pause()
 
     def cont(self, bot, update):
         """
         Method of continue command processing. Continue the training process
         """
-        self.flags_batch.append('c')
-        self.message('Training continue in less than 10s')
+        if not self.control.resume():
+            self.message('Training is not suspended')
 
     def verbose(self, bot, update):
         """
@@ -109,10 +409,60 @@ class NotifierTelegram(NotifierBase):
         """
         Method of stop (training) command processing
         """
-        self.flags_batch.append('s')
+        self.control.interrupt()
 
         self.message('Training interrupting...')
 
     def _close_connect(self):
-        self.updater.stop()
+        """
+        End of training: deliver queued messages, close the connection of non-persistent session
+        """
+        self.close_logs()
+
+        if not self.persistent:
+            self.close()
+            return
+
+        if self.send_queue is not None:
+            self.send_queue.flush(self.flush_timeout)
+
+        if self.spool is not None:
+            self.spool.sync()
+
+    def close(self, timeout=None):
+        """
+        Close the connection: deliver queued messages and stop the bot in timeout seconds (shutdown_timeout by default)
+        """
+        if not self.active:
+            return
+
+        timeout = self.shutdown_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        if self.send_queue is not None:
+            self.send_queue.stop(min(self.flush_timeout, timeout))
+
+        if self.spool is not None:
+            self.spool.close()
+
+        if self.resources is not None:
+            self.resources.stop()
+
+        self.charts.close(max(deadline - time.monotonic(), 0))
+        self.close_logs()
+
+        if self.webhook is not None:
+            self.webhook.stop()
+            # updates are kept by telegram for the polling or the next start
+            if self.webhook.url is not None:
+                try:
+                    self.updater.bot.delete_webhook(timeout=max(deadline - time.monotonic(), 0.1))
+                except Exception as e:
+                    print('Webhook is not deleted. {}'.format(e))
+
+        # stop of the updater waits for the end of the long polling request
+        stopper = threading.Thread(target=self.updater.stop, name='notifyker-stop', daemon=True)
+        stopper.start()
+        stopper.join(max(deadline - time.monotonic(), 0))
+
         self.active = False
@@ -0,0 +1,859 @@
+import asyncio
+import atexit
+import collections
+import concurrent.futures
+import heapq
+import itertools
+import re
+import threading
+import time
+
+import aiohttp
+
+from .delivery import FATAL, FLOOD, NOT_MODIFIED, RETRYABLE, Backoff, FloodGate
+from .notifier_base import PRIORITY_LOW, PRIORITY_NORMAL, NotifierBase
+from .rate_limit import RateLimiter
+from .send_queue import Ack, MessageRef, SendJob
+
+API_URL = 'https://api.telegram.org/bot'
+END = -1  # state of the finished conversation
+
+
+class ApiError(Exception):
+    """
+    Unsuccessful response of the bot API: error code, description and retry_after of the flood control
+    """
+    def __init__(self, error_code, description='', retry_after=None):
+        super().__init__('{} {}'.format(error_code, description))
+        self.error_code = error_code
+        self.description = description
+        self.retry_after = retry_after if retry_after is not None or error_code != 429 else 1
+
+
+def classify(error):
+    """
+    Classify the error of the request of the asynchronous client (see delivery.classify)
+    """
+    if isinstance(error, ApiError):
+        if error.error_code == 429:
+            return FLOOD
+
+        if error.error_code >= 500:
+            return RETRYABLE
+
+        if 'not modified' in error.description.lower():
+            return NOT_MODIFIED
+
+        return FATAL
+
+    if isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError)):
+        return RETRYABLE
+
+    return FATAL
+
+
+def keyboard(*rows):
+    """
+    Reply keyboard markup of the rows of button texts
+    """
+    return {'keyboard': [[{'text': text} for text in row] for row in rows], 'one_time_keyboard': False}
+
+
+REMOVE_KEYBOARD = {'remove_keyboard': True}
+
+
+class IncomingMessage:
+    """
+    Text message received by the bot, mimics telegram.Message (chat_id, text, reply_text)
+    """
+    def __init__(self, notifier, chat_id, text):
+        self.chat_id = chat_id
+        self.text = text
+        self._notifier = notifier
+
+    def reply_text(self, text, reply_markup=None):
+        job = SendJob(text, MessageRef(), reply_markup)
+        self._notifier._spawn(self._notifier._dispatch_chat(job, self.chat_id))
+
+
+class IncomingUpdate:
+    """
+    Update of the bot with the text message, mimics telegram.Update
+    """
+    def __init__(self, update_id, message):
+        self.update_id = update_id
+        self.message = message
+
+
+class Conversation:
+    """
+    Conversation of the chat, mimics telegram ConversationHandler
+
+    The entry command starts the conversation, in each state the text is matched against
+    the patterns of the state. The handler returns the next state (None keeps the state,
+    END finishes the conversation), fallback commands are handled in any state
+
+    Args:
+        entry_points: dict of command: handler
+        states: dict of state: list of (pattern, handler)
+        fallbacks: dict of command: handler
+    """
+    def __init__(self, entry_points, states, fallbacks):
+        self.entry_points = entry_points
+        self.states = {state: [(re.compile(pattern), handler) for pattern, handler in handlers]
+                       for state, handlers in states.items()}
+        self.fallbacks = fallbacks
+        self.chats = {}  # chat id: current state
+
+    def handle(self, bot, command, update):
+        """
+        Process the update, return True if it belongs to the conversation
+        """
+        chat_id = update.message.chat_id
+        state = self.chats.get(chat_id)
+
+        if command is not None:
+            handler = self.entry_points.get(command)
+            if handler is None and state is not None:
+                handler = self.fallbacks.get(command)
+        elif state is not None:
+            handler = next((handler for pattern, handler in self.states.get(state, [])
+                            if pattern.match(update.message.text)), None)
+        else:
+            handler = None
+
+        if handler is None:
+            return False
+
+        state = handler(bot, update)
+        if state == END:
+            self.chats.pop(chat_id, None)
+        elif state is not None:
+            self.chats[chat_id] = state
+
+        return True
+
+
+class NotifierTelegramAsync(NotifierBase):
+    """
+    Telegram notifier bot on the asyncio event loop
+
+    The bot API is called with aiohttp from the event loop running in the background
+    thread. Requests share the pool of keep-alive connections, so sends do not pay for
+    the connection setup, and up to max_in_flight requests are performed at once. Long
+    polling of the commands runs on the same loop
+
+    message never blocks the training thread: it schedules the delivery and returns the
+    ack with MessageRef, ids of the message are filled in when it is delivered. Each
+    message is delivered to all subscribed chats concurrently. Edits of the message are
+    sent in order after the message itself, while the edit is in flight only the newest
+    pending text is kept (see coalesced). Edits which do not change the text are not sent.
+    Messages waiting for the rate limit of the chat are sent by priority, then in order
+
+    Requests failed due to network errors are retried with the exponential backoff, flood
+    control errors are retried after retry_after, no requests are sent while the flood
+    control is active. Requests are limited by the token buckets of the chat and of the
+    bot (see RateLimiter)
+
+    Handlers are the same as of NotifierTelegramMenu: /start, /help, /status, /pause,
+    /continue, /interrupt, /verbose, /plot, /export, /perf and the keyboard menu (/menu, /cancel).
+    They are called on the event loop, so they must not block. With the webhook (see Webhook)
+    the updates are received by the embedded HTTP server instead of the long polling
+
+    python-telegram-bot is not required, install aiohttp
+
+    Args:
+        TOKEN: telegram bot token
+        PROXY: url of the HTTP proxy or request_kwargs of the telegram Updater with proxy_url
+        chat_id: id of the chat to send messages or list of ids (set by /start if None)
+        max_in_flight: max number of concurrent requests
+        connections: max number of pooled connections
+        keepalive_timeout: time (seconds) to keep the idle connection open
+        request_timeout: max time (seconds) of the request
+        poll_timeout: timeout (seconds) of the long polling of the commands
+        flush_timeout: max time (seconds) to deliver scheduled messages on the connection close
+        backoff: Backoff of retryable errors
+        rate_limiter: RateLimiter of requests, by default 1 message per second per chat and 30 per second per bot
+        persistent: keep the connection after the end of training
+        shutdown_timeout: max time (seconds) to close the connection
+        base_url: url of the bot API (the token is appended), e.g. of the local API server, official by default
+        webhook: Webhook which receives the commands, None - long polling
+    """
+    DELIVERED_CACHE_SIZE = 64
+
+    def __init__(self, TOKEN=None, PROXY=None, chat_id=None, max_in_flight=16, connections=16,
+                 keepalive_timeout=30, request_timeout=10, poll_timeout=10, flush_timeout=5, backoff=None,
+                 rate_limiter=None, persistent=False, shutdown_timeout=10, base_url=None, webhook=None):
+        """
+        Create handlers and chat id for message edits, start the event loop
+        """
+        super().__init__()
+        self.active = False
+
+        self.chat_ids = []  # subscribed chats
+        for i in (chat_id if isinstance(chat_id, (list, tuple)) else [chat_id]):
+            self.subscribe(i)
+
+        self.__url = '{}{}/'.format(base_url or API_URL, TOKEN)
+        self.__proxy = PROXY.get('proxy_url') if isinstance(PROXY, dict) else PROXY
+
+        self.max_in_flight = max_in_flight
+        self.connections = connections
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = request_timeout
+        self.poll_timeout = poll_timeout
+        self.flush_timeout = flush_timeout
+        self.persistent = persistent
+        self.shutdown_timeout = shutdown_timeout
+        self.webhook = webhook
+
+        self.backoff = backoff if backoff is not None else Backoff()
+        self.flood = FloodGate()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+
+        self.skipped_edits = 0  # edits with the text which is already delivered
+        self.coalesced = 0  # pending edits replaced by the newer ones
+        self.dropped = 0  # messages which are not delivered before the close
+        self._delivered = collections.OrderedDict()  # (chat id, message id): hash of the last delivered text
+
+        self.commands = {}  # command: handler
+        self.conversations = []
+        self.default_reply_markup = keyboard(['Status'], ['Verbose'], ['Pause'], ['Continue'], ['Interrupt'])
+
+        # state of the event loop, it is touched only from the loop thread
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._in_flight = None  # semaphore of the concurrent requests
+        self._poller = None
+        self._tasks = set()  # deliveries in progress
+        self._lanes = {}  # key of the message in flight: the newest pending job or None
+        self._waiting = {}  # chat id: (heap of (priority, order) of the waiting messages, condition of the heap)
+        self._order = itertools.count()
+
+        self.handlers()
+        self._connect()
+
+        if persistent:
+            atexit.register(self.close)
+
+    @property
+    def chat_id(self):
+        """
+        The first subscribed chat
+        """
+        return self.chat_ids[0] if self.chat_ids else None
+
+    @chat_id.setter
+    def chat_id(self, chat_id):
+        self.subscribe(chat_id)
+
+    def subscribe(self, chat_id):
+        """
+        Send messages to the chat too
+        """
+        if chat_id is not None and chat_id not in self.chat_ids:
+            self.chat_ids.append(chat_id)
+
+    def unsubscribe(self, chat_id):
+        if chat_id in self.chat_ids:
+            self.chat_ids.remove(chat_id)
+
+    def _connect(self):
+        if not self.active:
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._run_loop, name='notifyker-asyncio', daemon=True)
+            self._thread.start()
+            asyncio.run_coroutine_threadsafe(self._open(), self._loop).result()
+
+            if self.webhook is not None:
+                self._start_webhook()
+
+            if self.resources is not None:
+                self.resources.start()
+
+            self.active = True
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    async def _open(self):
+        connector = aiohttp.TCPConnector(limit=self.connections, keepalive_timeout=self.keepalive_timeout)
+        self._session = aiohttp.ClientSession(connector=connector,
+                                              timeout=aiohttp.ClientTimeout(total=self.request_timeout))
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        # the state of the previous session belongs to its closed loop
+        self._tasks = set()
+        self._lanes = {}
+        self._waiting = {}
+        self._order = itertools.count()
+        if self.webhook is None:
+            self._poller = self._loop.create_task(self._poll())
+
+    def _start_webhook(self):
+        """
+        Start the server of the webhook, register it if the url is set
+        """
+        # the update is handled on the loop, the server thread only passes it
+        self.webhook.start(lambda data: self._loop.call_soon_threadsafe(self._handle_update, data))
+
+        if self.webhook.url is not None:
+            params = {'url': self.webhook.url, 'secret_token': self.webhook.secret_token}
+            try:
+                asyncio.run_coroutine_threadsafe(self._call('setWebhook', params), self._loop).result()
+            except Exception as e:
+                print('Webhook is not registered. {}'.format(e))
+
+    def message(self, message, message_id=None, reply_markup=None, priority=None):
+        """
+        Schedule the message (or the edit of message_id) to all subscribed chats, return the ack
+
+        By default priority of edits is low, priority of new messages is normal
+        """
+        ref = message_id if isinstance(message_id, MessageRef) else MessageRef(message_id, self.chat_id)
+        if priority is None:
+            priority = PRIORITY_LOW if message_id is not None else PRIORITY_NORMAL
+
+        if not self.active:
+            print('Notifier is closed, the message is not sent')
+            return Ack(ref)
+
+        start = self.perf.start()
+        self._loop.call_soon_threadsafe(self._submit, SendJob(message, ref, reply_markup, priority))
+        self.perf.gauge('in flight', len(self._lanes))
+        self.perf.stop('send', start)
+
+        return Ack(ref)
+
+    def _spawn(self, coroutine):
+        """
+        Run the delivery on the loop, it is awaited by flush
+        """
+        task = self._loop.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        return task
+
+    def _submit(self, job):
+        """
+        Start the delivery of the job or keep it until the previous text of the message is delivered (loop thread)
+        """
+        key = job.ref.key
+        if key in self._lanes:
+            if self._lanes[key] is not None:
+                self.coalesced += 1
+            self._lanes[key] = job
+            return
+
+        self._lanes[key] = None
+        self._spawn(self._run_lane(job))
+
+    async def _run_lane(self, job):
+        key = job.ref.key
+        try:
+            while job is not None:
+                await self._dispatch(job)
+                job, self._lanes[key] = self._lanes[key], None
+        finally:
+            del self._lanes[key]
+
+    async def _dispatch(self, job):
+        """
+        Send the message (or edit it) in each subscribed chat concurrently, fill in the ids of the reference
+        """
+        await asyncio.gather(*(self._dispatch_chat(job, chat_id) for chat_id in list(self.chat_ids)))
+
+    async def _dispatch_chat(self, job, chat_id):
+        ref = job.ref
+        message_id = ref.message_ids.get(chat_id)
+        try:
+            delivered = await self._send(job.text, chat_id, message_id, job.reply_markup, job.priority)
+        except Exception as e:
+            print('Chat {} is not active. {}'.format(chat_id, e))
+            # the next edit sends the new message if this one can not be edited
+            if message_id is not None and classify(e) == FATAL:
+                ref.message_ids.pop(chat_id, None)
+            return
+
+        if message_id is None:
+            ref.message_ids[chat_id] = delivered
+
+    async def _send(self, message, chat_id, message_id=None, reply_markup=None, priority=PRIORITY_NORMAL):
+        """
+        Send new message or edit the existing one in the chat with retries, return the message id
+        """
+        digest = hash(message)
+
+        if message_id is not None:
+            if self._delivered.get((chat_id, message_id)) == digest:
+                self.skipped_edits += 1
+                return message_id
+
+            method, params = 'editMessageText', {'chat_id': chat_id, 'message_id': message_id, 'text': message}
+        else:
+            method, params = 'sendMessage', {'chat_id': chat_id, 'text': message}
+            if reply_markup is not None:
+                params['reply_markup'] = reply_markup
+
+        await self._throttle(chat_id, priority)
+
+        start = time.monotonic()
+        result = await self._deliver(method, params)
+        self._measure_latency(time.monotonic() - start)
+
+        # telegram rejected the edit with the same text
+        if isinstance(result, dict):
+            message_id = result.get('message_id', message_id)
+
+        key = (chat_id, message_id)
+        self._delivered[key] = digest
+        self._delivered.move_to_end(key)
+        # only recent messages are edited, keep the cache small
+        if len(self._delivered) > self.DELIVERED_CACHE_SIZE:
+            self._delivered.popitem(last=False)
+
+        return message_id
+
+    def photo(self, image, caption=None):
+        """
+        Send the image (PNG bytes) to each subscribed chat, called from the thread of the charts
+        """
+        self._submit_upload('sendPhoto', 'photo', image, 'chart.png', 'image/png', caption)
+
+    def document(self, data, filename, caption=None):
+        """
+        Send the file (bytes) to each subscribed chat
+        """
+        self._submit_upload('sendDocument', 'document', data, filename, 'application/octet-stream', caption)
+
+    def _submit_upload(self, method, field, data, filename, content_type, caption):
+        if self.active:
+            self._loop.call_soon_threadsafe(self._spawn_uploads, method, field, data, filename, content_type, caption)
+
+    def _spawn_uploads(self, *upload):
+        for chat_id in list(self.chat_ids):
+            self._spawn(self._upload(chat_id, *upload))
+
+    async def _upload(self, chat_id, method, field, data, filename, content_type, caption):
+        def form():
+            body = aiohttp.FormData()
+            body.add_field('chat_id', str(chat_id))
+            if caption:
+                body.add_field('caption', caption)
+            body.add_field(field, data, filename=filename, content_type=content_type)
+
+            return body
+
+        try:
+            await self._throttle(chat_id, PRIORITY_LOW)
+            await self._deliver(method, form=form)
+        except Exception as e:
+            print('Chat {} is not active. {}'.format(chat_id, e))
+
+    async def _throttle(self, chat_id, priority):
+        """
+        Wait for the rate limit of the chat, the first waiting message of the highest priority takes the token
+        """
+        if chat_id not in self._waiting:
+            self._waiting[chat_id] = ([], asyncio.Condition())
+        heap, changed = self._waiting[chat_id]
+
+        entry = (priority, next(self._order))
+        heapq.heappush(heap, entry)
+
+        async with changed:
+            try:
+                while True:
+                    if heap[0] != entry:
+                        await changed.wait()
+                        continue
+
+                    delay = self.rate_limiter.reserve(chat_id)
+                    if delay == 0:
+                        return
+
+                    try:
+                        await asyncio.wait_for(changed.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                heap.remove(entry)
+                heapq.heapify(heap)
+                changed.notify_all()
+
+    async def _deliver(self, method, params=None, form=None):
+        """
+        Perform the request with retries (see delivery.deliver), return the result or None if the message is not modified
+        """
+        attempt = 0
+
+        while True:
+            remaining = self.flood.remaining()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+
+            try:
+                async with self._in_flight:
+                    return await self._call(method, params, form=form)
+            except Exception as e:
+                kind = classify(e)
+
+                if kind == NOT_MODIFIED:
+                    return None
+
+                if kind == FLOOD:
+                    self.flood.hold(e.retry_after)
+                    continue
+
+                if kind != RETRYABLE or attempt >= self.backoff.retries:
+                    raise
+
+                await asyncio.sleep(self.backoff.delay(attempt))
+                attempt += 1
+
+    async def _call(self, method, params=None, timeout=None, form=None):
+        """
+        Request of the bot API over the pooled connection, return the result or raise ApiError
+
+        form() returns the multipart body (aiohttp.FormData) instead of JSON params, the body is built for each attempt
+        """
+        kwargs = {'timeout': aiohttp.ClientTimeout(total=timeout)} if timeout is not None else {}
+        if form is not None:
+            kwargs['data'] = form()
+        else:
+            kwargs['json'] = params or {}
+
+        async with self._session.post(self.__url + method, proxy=self.__proxy, **kwargs) as response:
+            try:
+                data = await response.json(content_type=None)
+            except ValueError:
+                raise ApiError(response.status, 'Invalid response')
+
+        if not data.get('ok'):
+            raise ApiError(data.get('error_code', response.status), data.get('description', ''),
+                           (data.get('parameters') or {}).get('retry_after'))
+
+        return data.get('result')
+
+    async def _poll(self):
+        """
+        Long polling of the updates, the handlers are called on the loop
+        """
+        try:
+            await self._call('deleteWebhook')
+        except Exception:
+            pass
+
+        offset = None
+        attempt = 0
+        while True:
+            params = {'timeout': self.poll_timeout}
+            if offset is not None:
+                params['offset'] = offset
+
+            try:
+                updates = await self._call('getUpdates', params, self.poll_timeout + self.request_timeout)
+            except Exception as e:
+                if classify(e) == FLOOD:
+                    await asyncio.sleep(e.retry_after)
+                else:
+                    await asyncio.sleep(self.backoff.delay(attempt))
+                    attempt = min(attempt + 1, 10)
+                continue
+
+            attempt = 0
+            for update in updates:
+                offset = update['update_id'] + 1
+                self._handle_update(update)
+
+    def _handle_update(self, data):
+        """
+        Call the handler of the command or of the conversation
+        """
+        message = data.get('message')
+        if not message or 'text' not in message:
+            return
+
+        text = message['text']
+        update = IncomingUpdate(data['update_id'], IncomingMessage(self, message['chat']['id'], text))
+        # /command@bot_name arguments
+        command = text.split()[0][1:].split('@')[0] if text.startswith('/') else None
+
+        try:
+            handler = self.commands.get(command)
+            if handler is not None:
+                handler(self, update)
+                return
+
+            for conversation in self.conversations:
+                if conversation.handle(self, command, update):
+                    return
+        except Exception as e:
+            print('Command {!r} is not handled. {}'.format(text, e))
+
+    def handlers(self):
+        """
+        Method of activation of telegram bot handlers
+        """
+        self.commands['start'] = self.start
+        self.commands['interrupt'] = self.interrupt
+        self.commands['help'] = self._help
+        self.commands['status'] = self.status
+        self.commands['pause'] = self.pause
+        self.commands['verbose'] = self.verbose
+        self.commands['continue'] = self.cont
+        self.commands['perf'] = self.perf_report
+        self.commands['plot'] = self.plot
+        self.commands['export'] = self.export
+
+        self.conversations.append(Conversation(
+            entry_points={'menu': self.menu},
+            states={
+                0: [('^(Status|Verbose|Pause|Continue|Interrupt)$', self.menu_handler)],
+                1: [('^(Unchanged|0|1|2)$', self.verbose_handler)],
+                2: [('^(Yes|No)$', self.interrupt_handler)],
+            },
+            fallbacks={'cancel': self.cancel}))
+
+    @property
+    def edits_saved(self):
+        """
+        Number of edits which were not sent: replaced by the newer ones or with the unchanged text
+        """
+        return self.coalesced + self.skipped_edits
+
+    def perf_text(self):
+        """
+        Message with the overhead of the notifier and the state of the delivery
+        """
+        lines = [super().perf_text()]
+        lines.append('in flight: {} messages, {} coalesced, {} dropped'.format(len(self._lanes), self.coalesced,
+                                                                             self.dropped))
+        lines.append('skipped edits: {}'.format(self.skipped_edits))
+
+        return ' \n'.join(lines)
+
+    def start(self, bot, update):
+        """
+        Method of start message processing required to obtain chat_id
+        """
+        if self.chat_id is None:
+            self.chat_id = update.message.chat_id
+
+        update.message.reply_text('Hello, my friend. /menu')
+
+    def _help(self, bot, update):
+        """
+        Method of help command processing
+        """
+        if self.chat_id is None:
+            self.chat_id = update.message.chat_id
+
+        message = 'Welcome! Enter /start to add your chat_id before you start training\n\
+/help - Show available commands\n\
+/status - Show current training status - epoch, metrics\n\
+/pause - Suspend training process (model still in a memory)\n\
+/continue - Continue training process\n\
+/interrupt - Interrupt training process ATTENTION: You will not be able to continue by this bot\n\
+/plot - Chart of the metrics: /plot [epochs] [metric ...]\n\
+/export - Logged metrics (npz): /export [epochs] [first step] [last step]\n\
+/perf - Show overhead of the notifier\n\
+/menu - Activate keyboard menu with the same options\n'
+        self.message(message)
+
+    def pause(self, bot, update):
+        """
+        Method of pause command processing. Suspend the training process
+        """
+        # suspend the training in the end of the current batch
+        self.control.pause()
+
+    def cont(self, bot, update):
+        """
+        Method of continue command processing. Continue the training process
+        """
+        if not self.control.resume():
+            self.message('Training is not suspended')
+
+    def verbose(self, bot, update):
+        """
+        Get current verbose level
+        0 - only the last message about the end of training
+        1 - status of each epoch end
+        2 - update of each batch result
+        """
+        self.message('Current verbose: {}'.format(self.verbose_value))
+
+    def interrupt(self, bot, update):
+        """
+        Method of stop (training) command processing
+        """
+        self.control.interrupt()
+
+        self.message('Training interrupting...')
+
+    def menu(self, bot, update):
+        """
+        Method of menu command processing. Return the keyboard-menu
+        """
+        self.message('Menu activated', reply_markup=self.default_reply_markup)
+
+        return 0
+
+    def cancel(self, bot, update):
+        self.message('Cancel', reply_markup=REMOVE_KEYBOARD)
+
+        return END
+
+    def menu_handler(self, bot, update):
+        """
+        Process menu choice
+        """
+        option = update.message.text
+
+        if option == 'Status':
+            self.status()
+
+        elif option == 'Verbose':
+            return self.verbose_menu(bot, update)
+
+        elif option == 'Pause':
+            return self.pause(bot, update)
+
+        elif option == 'Continue':
+            return self.cont(bot, update)
+
+        elif option == 'Interrupt':
+            return self.interrupt_menu(bot, update)
+
+    def verbose_menu(self, bot, update):
+        """
+        Send verbose menu and return the state of the choice
+        """
+        options = ['Unchanged'] + [str(i) for i in range(3) if i != self.verbose_value]
+        self.message('Current verbose: {}. Set to: '.format(self.verbose_value),
+                     reply_markup=keyboard(*([i] for i in options)))
+
+        return 1
+
+    def verbose_handler(self, bot, update):
+        """
+        Handle the user choice of verbose
+        """
+        option = update.message.text
+        if option != 'Unchanged':
+            self.verbose_value = int(option)
+
+        self.message('Verbose: {}'.format(self.verbose_value), reply_markup=self.default_reply_markup)
+        self.cache_message_id = None
+        return 0
+
+    def interrupt_menu(self, bot, update):
+        """
+        Ask to confirm the interruption
+        """
+        self.message('Are you sure you want to interrupt?', reply_markup=keyboard(['No'], ['Yes']))
+
+        return 2
+
+    def interrupt_handler(self, bot, update):
+        """
+        Handle the user choice of interruption
+        """
+        option = update.message.text
+        if option == 'Yes':
+            self.control.interrupt()
+            self.message('Training interrupting...', reply_markup=REMOVE_KEYBOARD)
+        else:
+            self.control.resume()
+            self.message('Training continue', reply_markup=self.default_reply_markup)
+
+        return 0
+
+    def flush(self, timeout=None):
+        """
+        Wait for the delivery of the scheduled messages not longer than timeout seconds (flush_timeout by default)
+
+        Return True if all of them are delivered
+        """
+        if not self.active:
+            return True
+
+        future = asyncio.run_coroutine_threadsafe(self._flush(), self._loop)
+        try:
+            future.result(self.flush_timeout if timeout is None else timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            return False
+
+        return True
+
+    async def _flush(self):
+        while self._tasks:
+            await asyncio.wait(list(self._tasks))
+
+    def _close_connect(self):
+        """
+        End of training: deliver scheduled messages, close the connection of non-persistent session
+        """
+        self.close_logs()
+
+        if not self.persistent:
+            self.close()
+            return
+
+        self.flush()
+
+    def close(self, timeout=None):
+        """
+        Close the connection: deliver scheduled messages and stop the loop in timeout seconds (shutdown_timeout by default)
+        """
+        if not self.active:
+            return
+
+        timeout = self.shutdown_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        # the chart being rendered is sent before the flush
+        self.charts.close(max(deadline - time.monotonic(), 0))
+        self.close_logs()
+
+        if not self.flush(max(min(self.flush_timeout, deadline - time.monotonic()), 0)):
+            self.dropped += len(self._lanes)
+        self.active = False
+
+        if self.resources is not None:
+            self.resources.stop()
+
+        if self.webhook is not None:
+            self.webhook.stop()
+            # updates are kept by telegram for the polling or the next start
+            if self.webhook.url is not None:
+                future = asyncio.run_coroutine_threadsafe(self._call('deleteWebhook'), self._loop)
+                try:
+                    future.result(max(deadline - time.monotonic(), 0))
+                except Exception as e:
+                    print('Webhook is not deleted. {}'.format(e))
+
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(max(deadline - time.monotonic(), 0))
+        except concurrent.futures.TimeoutError:
+            pass
+
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(max(deadline - time.monotonic(), 0))
+        if not self._thread.is_alive():
+            self._loop.close()
+
+    async def _shutdown(self):
+        """
+        Cancel the polling and the remaining deliveries, close the connections
+        """
+        tasks = list(self._tasks) + ([self._poller] if self._poller is not None else [])
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._session.close()
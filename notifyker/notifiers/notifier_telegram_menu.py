@@ -8,11 +8,11 @@ class NotifierTelegramMenu(NotifierTelegram):
     """
     Telegram notifier bot
     """
-    def __init__(self, TOKEN=None, PROXY=None, chat_id=None):
+    def __init__(self, TOKEN=None, PROXY=None, chat_id=None, **kwargs):
         """
         Create handlers and chat id for message edits
         """
-        super().__init__(TOKEN, PROXY)
+        super().__init__(TOKEN, PROXY, chat_id, **kwargs)
         menu_keyboard = [
             [InlineKeyboardButton("Status", callback_data='status')],
             [InlineKeyboardButton("Verbose", callback_data='verbose')],
@@ -57,6 +57,9 @@ class NotifierTelegramMenu(NotifierTelegram):
 
         message = 'Welcome! \n\
 /help - Show available commands\n\
+/plot - Chart of the metrics: /plot [epochs] [metric ...]\n\
+/export - Logged metrics (npz): /export [epochs] [first step] [last step]\n\
+/perf - Show overhead of the notifier\n\
 /menu - Activate keyboard menu with following options:\n\
 Status - Show current training status - epoch, metrics\n\
 Pause - Suspend training process (model still in a memory)\n\
@@ -151,17 +154,16 @@ Interrupt - Interrupt training process ATTENTION: You will not be able to contin
         """
         option = update.message.text
         if option == 'Yes':
-            self.flags_batch.append('s')
+            self.control.interrupt()
             self.message('Training interrupting...', reply_markup=ReplyKeyboardRemove())
         else:
-            self.flags_batch.append('c')
+            self.control.resume()
             self.message('Training continue', reply_markup=self.default_reply_markup)
 
         return 0
 
-    def _close_connect(self):
+    def close(self, timeout=None):
         """
         Stop bot poolling
         """
-        self.updater.stop()
-        self.active = False
+        super().close(timeout)
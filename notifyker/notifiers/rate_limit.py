@@ -0,0 +1,82 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket: rate tokens per second, at most capacity tokens are accumulated
+    """
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+
+        self._tokens = capacity
+        self._last = time.monotonic()
+
+    def delay(self, now):
+        """
+        Time (seconds) until the token is available
+        """
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+        return max(1 - self._tokens, 0) / self.rate
+
+    def consume(self):
+        self._tokens -= 1
+
+
+class RateLimiter:
+    """
+    Limits of the telegram bot API: per chat and global per bot
+
+    Args:
+        chat_rate: messages per second to the same chat
+        global_rate: messages per second of the bot
+        burst: number of messages to the chat which can be sent at once
+    """
+    def __init__(self, chat_rate=1.0, global_rate=30.0, burst=1):
+        self.chat_rate = chat_rate
+        self.burst = burst
+
+        self._global = TokenBucket(global_rate, max(int(global_rate), 1))
+        self._chats = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, chat_id):
+        """
+        Consume the tokens of the chat and of the bot if they are available
+
+        Return 0 if the tokens are consumed, otherwise the time (seconds) until they are available
+        """
+        with self._lock:
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                chat = self._chats[chat_id] = TokenBucket(self.chat_rate, self.burst)
+
+            now = time.monotonic()
+            delay = max(chat.delay(now), self._global.delay(now))
+
+            if delay == 0:
+                chat.consume()
+                self._global.consume()
+
+            return delay
+
+    def acquire(self, chat_id, max_wait=None):
+        """
+        Wait for the tokens of the chat and of the bot, consume them
+
+        Return False if the tokens are not available in max_wait seconds (None - wait as long as required)
+        """
+        while True:
+            delay = self.reserve(chat_id)
+            if delay == 0:
+                return True
+
+            if max_wait is not None and delay > max_wait:
+                return False
+
+            time.sleep(delay)
+            if max_wait is not None:
+                max_wait -= delay
@@ -0,0 +1,231 @@
+import collections
+import itertools
+import threading
+import time
+
+_ref_keys = itertools.count()
+
+
+class MessageRef:
+    """
+    Reference to the message which may be not delivered yet
+
+    Asynchronous notifier returns it instead of the real message id. The worker
+    fills message ids in when the ack arrives, so the edits of the message can be
+    queued before the message itself is sent. The same message sent to several chats
+    has the id in each chat
+    """
+    def __init__(self, message_id=None, chat_id=None):
+        self.message_ids = {} if message_id is None else {chat_id: message_id}  # chat id: message id
+        self.key = next(_ref_keys)  # unique in the process, identifies the message in the spool
+
+    @property
+    def message_id(self):
+        """
+        Id of the message in the first chat it is delivered to, None if it is not delivered yet
+        """
+        for message_id in self.message_ids.values():
+            return message_id
+
+        return None
+
+
+class Ack:
+    """
+    Acknowledgment of the queued message, mimics telegram.Message (message_id only)
+    """
+    def __init__(self, message_id):
+        self.message_id = message_id
+
+
+class SendJob:
+    """
+    Single queued message: the text and the reference of the message to send or to edit
+
+    The text is formatted once for all chats, priority is 0 (highest), 1 or 2 (lowest)
+    """
+    def __init__(self, text, ref, reply_markup=None, priority=1):
+        self.text = text
+        self.ref = ref
+        self.reply_markup = reply_markup
+        self.priority = priority
+
+
+class SendQueue:
+    """
+    Bounded queue of outgoing messages with the background delivery worker
+
+    The queue keeps only the newest text of each message: the job replaces the queued
+    job of the same message (latest state wins), so intermediate progress edits are
+    collapsed while the previous one is still in flight
+
+    Jobs of the higher priority are delivered first (e.g. the end of the training before
+    the progress edits), jobs of the same priority are delivered in order
+
+    Overflow policies (what to do with the new job when the queue is full):
+        drop_oldest - discard the oldest queued job of the lowest priority
+        block - wait until the worker frees the place
+        coalesce - discard the oldest queued edit of already delivered message,
+                   discard the oldest job of the lowest priority if there is no such job
+
+    Args:
+        deliver: function which sends the job, is called from the worker thread only
+        maxsize: max number of queued jobs
+        overflow: overflow policy
+    """
+    OVERFLOW_POLICIES = ('drop_oldest', 'block', 'coalesce')
+    PRIORITIES = 3
+
+    def __init__(self, deliver, maxsize=100, overflow='drop_oldest'):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError('Unknown overflow policy: {}'.format(overflow))
+
+        self.maxsize = max(maxsize, 1)
+        self.overflow = overflow
+
+        self.dropped = 0  # number of jobs discarded due to the overflow
+        self.coalesced = 0  # number of jobs replaced by the newer ones
+
+        self._deliver = deliver
+        self._jobs = [collections.deque() for _ in range(self.PRIORITIES)]
+        self._size = 0
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._worker = None
+        self._running = False
+
+    def __len__(self):
+        return self._size
+
+    def start(self):
+        """
+        Start the worker thread (if it is not started yet)
+        """
+        with self._cond:
+            if self._running:
+                return
+
+            self._running = True
+            self._worker = threading.Thread(target=self._run, name='notifyker-send', daemon=True)
+            self._worker.start()
+
+    def put(self, job):
+        """
+        Add the job to the queue, return immediately (except the 'block' policy on overflow)
+
+        Return False if the job is rejected: the worker is not running or is stopped while
+        the 'block' policy waits for the place, nothing would deliver the job (the caller sends it itself)
+        """
+        with self._cond:
+            if not self._running:
+                return False
+
+            if self._replace(job):
+                return True
+
+            if self._size >= self.maxsize:
+                if self.overflow == 'block':
+                    while self._size >= self.maxsize and self._running:
+                        self._cond.wait()
+
+                    if not self._running:
+                        return False
+
+                elif self.overflow == 'coalesce':
+                    self._drop_edit()
+
+                else:
+                    self._drop_oldest()
+
+            priority = min(max(job.priority, 0), self.PRIORITIES - 1)
+            self._jobs[priority].append(job)
+            self._size += 1
+            self._cond.notify_all()
+
+            return True
+
+    def flush(self, timeout=None):
+        """
+        Wait until all queued jobs are delivered, but not longer than timeout seconds
+
+        Return True if the queue is empty
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            while (self._size or self._in_flight) and self._running:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+
+                self._cond.wait(remaining)
+
+            return not self._size and not self._in_flight
+
+    def stop(self, timeout=None):
+        """
+        Flush the queue and stop the worker. Jobs which are not delivered in time are discarded
+        """
+        self.flush(timeout)
+
+        with self._cond:
+            self._running = False
+            self.dropped += self._size
+            for jobs in self._jobs:
+                jobs.clear()
+            self._size = 0
+            self._cond.notify_all()
+
+    def _replace(self, job):
+        for jobs in self._jobs:
+            # search from the newest job: it is the most probable one to be the same message
+            for i in range(len(jobs) - 1, -1, -1):
+                if jobs[i].ref is job.ref:
+                    # only the text is replaced: the position and the reply markup of the first send must survive
+                    jobs[i].text = job.text
+                    self.coalesced += 1
+                    return True
+
+        return False
+
+    def _drop_oldest(self):
+        for jobs in reversed(self._jobs):
+            if jobs:
+                jobs.popleft()
+                self._size -= 1
+                self.dropped += 1
+                return
+
+    def _drop_edit(self):
+        for jobs in reversed(self._jobs):
+            for i, queued in enumerate(jobs):
+                if queued.ref.message_id is not None:
+                    del jobs[i]
+                    self._size -= 1
+                    self.dropped += 1
+                    return
+
+        self._drop_oldest()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._size and self._running:
+                    self._cond.wait()
+
+                if not self._running:
+                    return
+
+                job = next(jobs for jobs in self._jobs if jobs).popleft()
+                self._size -= 1
+                self._in_flight += 1
+                self._cond.notify_all()
+
+            try:
+                self._deliver(job)
+            except Exception as e:
+                print('Message is not delivered. {}'.format(e))
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    self._cond.notify_all()
@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+import time
+
+
+class Spool:
+    """
+    Append-only file of messages which are not delivered due to the lost connection
+
+    Each record is a JSON line with the time, the key of the message, its text and the chat.
+    Edits of the same message have the same key, so only the final state of the message
+    is replayed. Records are written immediately, but fsync is called once per fsync_every
+    records. The file survives the restart of the process: the records are replayed by
+    the next notifier with the same path
+
+    After the failed replay the next one is attempted not earlier than in retry_interval
+    seconds, doubled after each failure up to max_retry_interval, so the messages sent
+    during the outage do not read the spool and wait for the network each time
+
+    Args:
+        path: path of the spool file
+        max_bytes: max size of the file, the oldest records are discarded to fit it
+        max_age: max age of the record (seconds), older records are discarded
+        fsync_every: number of records between fsync calls
+        retry_interval: min time (seconds) between the failed replay and the next one
+        max_retry_interval: max time (seconds) between the replays
+    """
+    def __init__(self, path, max_bytes=10 * 2 ** 20, max_age=24 * 3600, fsync_every=16, retry_interval=1.0,
+                 max_retry_interval=60.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.fsync_every = max(fsync_every, 1)
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+
+        self.discarded = 0  # number of records discarded due to the size or age limits
+
+        self._lock = threading.RLock()
+        self._file = None
+        self._unsynced = 0
+        self._failures = 0  # number of the failed replays in a row
+        self._next_replay = 0.0  # monotonic time of the next replay
+
+    @property
+    def pending(self):
+        """
+        True if there are records to replay
+        """
+        try:
+            return os.path.getsize(self.path) > 0
+        except OSError:
+            return False
+
+    def append(self, key, text, chat_id=None):
+        """
+        Write the message to the spool
+        """
+        record = json.dumps({'time': time.time(), 'key': key, 'text': text, 'chat': chat_id}, ensure_ascii=False)
+
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+
+            self._file.write(record + '\n')
+            self._unsynced += 1
+
+            if self._unsynced >= self.fsync_every:
+                self.sync()
+
+            if self._file.tell() > self.max_bytes:
+                self.compact()
+
+    def sync(self):
+        """
+        Flush written records to the disk
+        """
+        with self._lock:
+            if self._file is not None and self._unsynced:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+
+    def load(self):
+        """
+        Read the records: superseded states of the same message and expired records are dropped
+
+        Return list of (key, text, time, chat_id) in the order of the final states
+        """
+        with self._lock:
+            self.sync()
+
+            try:
+                with open(self.path, encoding='utf-8') as fh:
+                    lines = fh.readlines()
+            except OSError:
+                return []
+
+        deadline = time.time() - self.max_age
+        records = {}
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # the last line can be broken by the crash
+                continue
+
+            if record['time'] < deadline:
+                self.discarded += 1
+                continue
+
+            # the final state takes the place of the latest edit
+            records.pop(record['key'], None)
+            records[record['key']] = (record['key'], record['text'], record['time'], record.get('chat'))
+
+        return list(records.values())
+
+    def compact(self):
+        """
+        Rewrite the file with the final states only, discard the oldest records above the size limit
+        """
+        with self._lock:
+            self._rewrite(self.load())
+
+    def replay(self, send, limit=None):
+        """
+        Send the spooled messages in order, stop on the first failure
+
+        Args:
+            send: function(key, text, chat_id), raises an exception if the message is not delivered
+            limit: max number of messages to send, None - all
+
+        Return True if the spool is empty, False if some messages are left or the replay is postponed
+        """
+        with self._lock:
+            if time.monotonic() < self._next_replay:
+                return False
+
+            records = self.load()
+            sent = 0
+
+            for key, text, _, chat_id in records:
+                if limit is not None and sent >= limit:
+                    break
+
+                try:
+                    send(key, text, chat_id)
+                except Exception:
+                    self._failures += 1
+                    self._next_replay = time.monotonic() + min(
+                        self.retry_interval * 2 ** min(self._failures - 1, 30), self.max_retry_interval)
+                    break
+
+                sent += 1
+                self._failures = 0
+
+            # the file is not changed if nothing is delivered (the empty spool drops the expired records)
+            if sent or not records:
+                self._rewrite(records[sent:])
+
+            return sent == len(records)
+
+    def close(self):
+        with self._lock:
+            self.sync()
+
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _rewrite(self, records):
+        lines = [json.dumps({'time': created, 'key': key, 'text': text, 'chat': chat_id}, ensure_ascii=False) + '\n'
+                 for key, text, created, chat_id in records]
+
+        # keep the newest records within 3/4 of the limit, so the compaction is not repeated on each append
+        size = sum(len(line.encode('utf-8')) for line in lines)
+        while lines and size > self.max_bytes * 3 // 4:
+            size -= len(lines.pop(0).encode('utf-8'))
+            self.discarded += 1
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._unsynced = 0
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            fh.writelines(lines)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+        os.replace(tmp_path, self.path)
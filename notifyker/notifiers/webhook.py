@@ -0,0 +1,141 @@
+import hmac
+import json
+import secrets
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class Webhook:
+    """
+    Embedded HTTP server of the telegram webhook: telegram POSTs the updates, there is no polling
+
+    The POST to path with the valid secret token (header X-Telegram-Bot-Api-Secret-Token)
+    is decoded and handled in the request thread before the response, so the command is
+    handled within one request. Updates are handled one at a time, as with the polling.
+    Requests with another token are rejected with 403, invalid JSON with 400
+
+    Telegram sends updates only to HTTPS urls (ports 443, 80, 88, 8443), the server listens
+    on plain HTTP: put it behind the reverse proxy which terminates TLS and forwards url to
+    host:port/path. If url is set the webhook is registered by the notifier at the start
+    (setWebhook with the secret token) and removed at the close
+
+    Args:
+        url: public url of the webhook, None - the webhook is not registered (e.g. local tests)
+        host: address of the server
+        port: port of the server, 0 - any free port
+        path: path of the webhook
+        secret_token: secret token of the requests, random if None
+        max_body: max size of the request (bytes)
+    """
+    def __init__(self, url=None, host='127.0.0.1', port=8443, path='/webhook', secret_token=None, max_body=2 ** 20):
+        self.url = url
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token or secrets.token_urlsafe(32)
+        self.max_body = max_body
+
+        self.received = 0  # number of handled updates
+        self.rejected = 0  # number of rejected requests
+
+        self._handle = None
+        self._handle_lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._server is not None
+
+    @property
+    def local_url(self):
+        """
+        Url of the running server, e.g. to POST the recorded updates
+        """
+        host, port = self._server.server_address[:2]
+
+        return 'http://{}:{}{}'.format(host, port, self.path)
+
+    def start(self, handle):
+        """
+        Start the server in the daemon thread, handle(data) is called with the decoded update
+        """
+        if self.running:
+            return
+
+        self._handle = handle
+        webhook = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # telegram keeps the connection open
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                webhook._request(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='notifyker-webhook', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self._thread = None
+
+    def authorized(self, token):
+        return hmac.compare_digest(token.encode('utf-8'), self.secret_token.encode('utf-8'))
+
+    def _request(self, request):
+        if request.path.split('?', 1)[0] != self.path:
+            self._respond(request, 404)
+            return
+
+        if not self.authorized(request.headers.get(SECRET_HEADER, '')):
+            self.rejected += 1
+            self._respond(request, 403)
+            return
+
+        length = int(request.headers.get('Content-Length') or 0)
+        if length > self.max_body:
+            self.rejected += 1
+            self._respond(request, 413, close=True)
+            return
+
+        try:
+            data = json.loads(request.rfile.read(length).decode('utf-8'))
+            if not isinstance(data, dict):
+                raise ValueError('update is not an object')
+        except ValueError:
+            self.rejected += 1
+            self._respond(request, 400)
+            return
+
+        # the error of the handler is not the error of the delivery, telegram must not repeat the update
+        try:
+            with self._handle_lock:
+                self._handle(data)
+        except Exception as e:
+            print('Update is not handled. {}'.format(e))
+
+        self.received += 1
+        self._respond(request, 200)
+
+    @staticmethod
+    def _respond(request, status, close=False):
+        try:
+            request.send_response(status)
+            request.send_header('Content-Length', '0')
+            if close:
+                request.send_header('Connection', 'close')
+                request.close_connection = True
+            request.end_headers()
+        except OSError:
+            pass
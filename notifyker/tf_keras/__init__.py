@@ -0,0 +1,5 @@
+from .._lazy import lazy_attributes
+
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    'CallbackSimpleTF': '.callback_simple_tf',
+})
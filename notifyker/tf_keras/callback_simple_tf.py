@@ -0,0 +1,205 @@
+import time
+
+from tensorflow import keras
+
+from ..notifiers.notifier_base import PRIORITY_HIGH
+from ..utils import ReportPolicy
+
+
+def to_python(value):
+    """
+    Fetch the value of the metric (tensor, numpy or python scalar) to the host
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class CallbackSimpleTF(keras.callbacks.Callback):
+    """
+    CallbackSimple for tf.keras (TF2)
+
+    tf.keras synchronizes the device and converts logs to numpy after each step if any
+    callback implements batch hooks. This callback implements them only if the batch
+    progress is reported (verbose 2 at the start of fit), and receives raw tensor logs,
+    so the metrics are fetched to the host only on the reporting steps. With batch hooks
+    disabled commands (/pause, /interrupt) are handled at the epoch boundaries
+
+    Args:
+        notifier: object of notifier that manage the training and messaging
+        custom_metrics: list of functions, which calculate user-specific metrics
+        policy: ReportPolicy of batch progress reports, by default 10 reports per epoch
+    """
+    def __init__(self, notifier=None, custom_metrics=None, policy=None):
+        super().__init__()
+        # keras passes logs as tensors, they are not synchronized on each step
+        self._supports_tf_logs = True
+
+        if custom_metrics is not None:
+            self.custom_metrics = custom_metrics
+
+        if notifier is not None:
+            self.notifier = notifier
+        else:
+            raise ValueError('Notifier is None')
+
+        self.details = {}
+        self.starting_time = None
+        self.batch_update_freq = None
+        self.current_epoch = 1
+        self.policy = policy if policy is not None else ReportPolicy()
+        self._step = 0  # number of steps from the beginning of the training
+        self._last_batch = -1
+
+    def _implements_train_batch_hooks(self):
+        # called by keras when fit creates the callback list
+        return self.notifier.verbose_value == 2
+
+    def on_train_begin(self, logs=None):
+        if not self.notifier.active:
+            self.notifier._connect()
+
+        self.notifier.reset_run()
+        # the metrics reach the host only at the reporting steps, keras reports the means since the epoch start
+        self.notifier.interval_means = True
+
+        for i in self.params:
+            self.details[i] = self.params[i]
+
+        self.starting_time = time.ctime(int(time.time()))
+        self.current_epoch = 1
+        # steps are unknown for the datasets without cardinality
+        steps = self.details.get('steps')
+        self.batch_update_freq = max(steps // 10, 1) if steps else 100
+        self._step = 0
+        self.policy.start(self._step, self.batch_update_freq)
+        self.notifier.throughput.start(self.details.get('epochs'), steps)
+        self.notifier.stall.start()
+
+        message = []
+        message.append('\nTraining started in {}\n'.format(self.starting_time))
+
+        if self.notifier.verbose_value == 2:
+            message.append('With the following parameters:')
+            for i in self.details:
+                message.append('{0:25s}: {1:25s}'.format(i, str(self.details[i])))
+
+        self.notifier.message(' \n'.join(message))
+
+    def on_train_end(self, logs=None):
+        if self.notifier.control.interrupted:
+            tag = 'forcibly'
+        else:
+            tag = 'successfully'
+
+        self.end_time = time.ctime(int(time.time()))
+
+        self.notifier.message('Training completed {} in {}'.format(tag, self.end_time), priority=PRIORITY_HIGH)
+
+        self.notifier._close_connect()
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self.notifier.stall.begin()
+
+    def on_train_batch_end(self, batch, logs=None):
+        try:
+            self._on_train_batch_end(batch, logs)
+        finally:
+            # the messages and the commands handled after the batch are not the waiting for the data
+            self.notifier.stall.resume()
+
+    def _on_train_batch_end(self, batch, logs):
+        hook = self.notifier.perf.start()
+        # with steps_per_execution > 1 keras calls the hook once per execution, so the batch is not consecutive
+        self._step += batch - self._last_batch
+        self._last_batch = batch
+        self.notifier.throughput.step(self._step)
+
+        alert = self.notifier.stall.end()
+        if alert is not None:
+            self.notifier.alert(alert)
+        self.notifier.perf.stop('batch hook', hook)
+
+        if self.notifier.control.pending:
+            self.flags_handler()
+
+        if self.notifier.verbose_value != 2 or not self.policy.due(self._step):
+            return
+
+        start = time.monotonic()
+        message = []
+        message.append('Epoch {} / {}'.format(self.current_epoch, self.details['epochs']))
+
+        steps = self.details.get('steps')
+        if steps:
+            filled = min(10 * (batch + 1) // steps, 10)
+            message.append('{} / {} [{}{}]'.format(batch + 1, steps, '++' * filled, '==' * (10 - filled)))
+        else:
+            message.append('Step {}'.format(batch + 1))
+        message.extend(self.notifier.throughput.lines())
+
+        values = {i: to_python(logs[i]) for i in logs or {}}
+        # the metrics are on the host only at the reporting steps, the history is recorded at them
+        self.notifier.observe(self._step, values)
+
+        for i in values:
+            message.append('{:15s}: {:15s}'.format(i, str(values[i])))
+        self.notifier.perf.stop('format', start)
+
+        ack = self.notifier.message(' \n'.join(message), self.notifier.cache_message_id)
+        self.notifier.cache_message_id = ack.message_id if ack is not None else None
+
+        self.policy.fired(self._step, time.monotonic() - start, self.notifier.send_latency)
+
+    def on_epoch_begin(self, epoch, logs=None):
+        if self.notifier.control.pending:
+            self.flags_handler()
+
+        self.notifier.cache_message_id = None
+        self._last_batch = -1
+        self.notifier.throughput.begin_epoch()
+        # validation of the previous epoch is not the waiting for the data
+        self.notifier.stall.restart()
+
+    def on_epoch_end(self, epoch, logs=None):
+        if self.notifier.control.pending:
+            self.flags_handler()
+
+        # without batch hooks the steps are counted at the end of the epoch
+        steps = self.details.get('steps')
+        if self._last_batch < 0 and steps:
+            self._step += steps
+            self.notifier.throughput.step(self._step)
+        self.notifier.throughput.end_epoch()
+
+        start = self.notifier.perf.start()
+        message = []
+        message.append('Epoch {} / {}'.format(self.current_epoch, self.details['epochs']))
+
+        values = {i: to_python(logs[i]) for i in logs or {}}
+        for i in values:
+            message.append('{:15s}: {:15s}'.format(i, str(values[i])))
+        message.extend(self.notifier.throughput.lines())
+        message.extend(self.notifier.epoch_spread())
+        message.extend(self.notifier.resource_lines())
+        self.notifier.perf.stop('format', start)
+
+        self.notifier._status = ' \n'.join(message)
+        self.notifier.observe_epoch(self.current_epoch, values)
+
+        if self.notifier.verbose_value != 0:
+            ack = self.notifier.message(' \n'.join(message), self.notifier.cache_message_id)
+            self.notifier.cache_message_id = ack.message_id if ack is not None else None
+
+        self.current_epoch += 1
+
+    def flags_handler(self):
+        """
+        Handle notifier commands in order to control the training
+        """
+        if self.notifier.handle_commands() == self.notifier.control.INTERRUPTED:
+            self.model.stop_training = True
+
+        # the time of the pause is not a part of the training steps
+        self.policy.restart(self._step)
@@ -0,0 +1,17 @@
+from .._lazy import lazy_attributes
+from .perf import NULL_PERF, PerfStats
+from .resources import ResourceSampler
+from .schedule import AdaptivePolicy, ReportPolicy
+from .sketch import MetricSketch, P2Quantile, SketchSet
+from .stall import StallDetector
+from .throughput import ThroughputMeter, format_duration
+
+# numpy is imported on the first access
+_ATTRIBUTES = {
+    'DivergenceMonitor': '.watchdog',
+    'MetricHistory': '.history',
+    'MetricLog': '.metric_log',
+    'MetricLogReader': '.metric_log',
+}
+
+__getattr__, __dir__ = lazy_attributes(__name__, _ATTRIBUTES)
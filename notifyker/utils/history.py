@@ -0,0 +1,179 @@
+import numpy as np
+
+
+class MetricHistory:
+    """
+    Fixed-memory history of metrics: step and one float64 column per metric in preallocated arrays
+
+    Records are appended in O(1), no Python objects are kept per record. When the buffer
+    is full the records are merged in pairs (mean of the values, the last step of the pair)
+    and the stride is doubled: each stored record covers `stride` reported steps, the values
+    of the skipped records are averaged into it. So the whole run is kept at the resolution
+    decreasing with its length, e.g. 10M steps of 8 metrics take capacity * 72 bytes
+
+    Metrics which are missing in the record (e.g. validation metrics between epochs) are NaN
+
+    Args:
+        capacity: max number of stored records (even)
+        columns: initial number of metric columns, the table grows when new metrics are reported
+    """
+    def __init__(self, capacity=4096, columns=8):
+        self.capacity = max(capacity - capacity % 2, 2)
+
+        self.names = {}  # metric name: column
+        self.steps = np.zeros(self.capacity, dtype=np.int64)
+        self.values = np.full((self.capacity, columns), np.nan)
+
+        self.size = 0
+        self.stride = 1  # number of records merged into the stored one
+        self.version = 0  # incremented on each change
+
+        # records which are merged into the next stored one
+        self._sum = np.zeros(columns)
+        self._count = np.zeros(columns, dtype=np.int64)
+        self._pending = 0
+        self._row = np.full(columns, np.nan)
+
+    def __len__(self):
+        return self.size
+
+    def record(self, step, metrics):
+        """
+        Append the values of metrics (dict of name: number) reported at the step
+        """
+        row = self._row
+        row.fill(np.nan)
+
+        names = self.names
+        for name, value in metrics.items():
+            column = names.get(name)
+            if column is None:
+                column = self._add_column(name)
+                row = self._row
+
+            try:
+                row[column] = value
+            except (TypeError, ValueError):
+                continue
+
+        finite = ~np.isnan(row)
+        np.add(self._sum, row, out=self._sum, where=finite)
+        self._count += finite
+        self._pending += 1
+
+        if self._pending < self.stride:
+            return
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.values[self.size] = self._sum / self._count
+
+        self.steps[self.size] = step
+        self.size += 1
+        self.version += 1
+
+        self._sum.fill(0)
+        self._count.fill(0)
+        self._pending = 0
+
+        if self.size == self.capacity:
+            self._downsample()
+
+    def column(self, name):
+        """
+        Return (steps, values) of the metric, views of the stored records
+        """
+        return self.steps[:self.size], self.values[:self.size, self.names[name]]
+
+    def summary(self, window=None):
+        """
+        Min, mean and last value of each metric over the last `window` steps (None - the whole history)
+
+        Min is taken over the stored records, so the values merged by the downsampling are averaged
+
+        Return dict of name: (min, mean, last), metrics without values in the window are omitted
+        """
+        if self.size == 0:
+            return {}
+
+        # the status is read from the bot thread while the training thread can add the metric,
+        # the columns of the snapshot are in the values read after it
+        names = list(self.names.items())
+
+        size = self.size
+        start = 0
+        if window is not None:
+            start = np.searchsorted(self.steps[:size], self.steps[size - 1] - window, side='right')
+
+        # the window is shorter than the spacing of the stored steps
+        if start >= size:
+            return {}
+
+        values = self.values[start:size]
+        finite = ~np.isnan(values)
+        present = finite.any(axis=0)
+
+        with np.errstate(invalid='ignore'):
+            minimum = np.where(finite, values, np.inf).min(axis=0)
+            mean = np.nansum(values, axis=0) / finite.sum(axis=0)
+
+        # index of the last value of each metric
+        last = values[finite.shape[0] - 1 - np.argmax(finite[::-1], axis=0), np.arange(values.shape[1])]
+
+        return {name: (float(minimum[column]), float(mean[column]), float(last[column]))
+                for name, column in names if present[column]}
+
+    def clear(self):
+        self.names = {}
+        self.values.fill(np.nan)
+        self.size = 0
+        self.stride = 1
+        self.version += 1
+
+        self._sum.fill(0)
+        self._count.fill(0)
+        self._pending = 0
+
+    def _add_column(self, name):
+        column = len(self.names)
+
+        if column == self.values.shape[1]:
+            grow = self.values.shape[1]
+            self.values = np.hstack([self.values, np.full((self.capacity, grow), np.nan)])
+            self._sum = np.concatenate([self._sum, np.zeros(grow)])
+            self._count = np.concatenate([self._count, np.zeros(grow, dtype=np.int64)])
+            # keep the values of the record which is being filled
+            self._row = np.concatenate([self._row, np.full(grow, np.nan)])
+
+        # the column is visible to the readers of the other threads when the arrays have it
+        self.names[name] = column
+
+        return column
+
+    def _downsample(self):
+        """
+        Merge the stored records in pairs, double the stride
+        """
+        pairs = self.values.reshape(self.capacity // 2, 2, -1)
+        finite = ~np.isnan(pairs)
+
+        with np.errstate(invalid='ignore'):
+            merged = np.nansum(pairs, axis=1) / finite.sum(axis=1)
+
+        half = self.capacity // 2
+        self.values[:half] = merged
+        self.values[half:] = np.nan
+        self.steps[:half] = self.steps[1::2]
+
+        self.size = half
+        self.stride *= 2
+
+
+def format_summary(summary, title):
+    """
+    Lines of the status message with min, mean and last value of each metric
+    """
+    message = [title]
+    for name, (minimum, mean, last) in summary.items():
+        message.append('{:15s}: min {:.4g} mean {:.4g} last {:.4g}'.format(name, minimum, mean, last))
+
+    return message
@@ -0,0 +1,335 @@
+"""
+Append-only columnar log of the metrics on the disk
+
+The directory holds one file per column: steps.i64 (int64), times.f64 (float64, unix time)
+and <n>_<metric>.f64 (float64) for each metric, raw little-endian values without headers,
+so each column is loaded by numpy.memmap without copying. columns.json lists the metrics,
+their files and the row of the first value (metrics reported later start later), and the
+first rows of the runs (steps of the new training start again)
+"""
+import io
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+MANIFEST = 'columns.json'
+STEPS = 'steps.i64'
+TIMES = 'times.f64'
+STEP_DTYPE = np.dtype('<i8')
+VALUE_DTYPE = np.dtype('<f8')
+
+
+def _column_file(index, name):
+    return '{}_{}.f64'.format(index, re.sub(r'[^A-Za-z0-9_.-]+', '_', name)[:64])
+
+
+def _size(path, dtype):
+    """
+    Number of the values in the file
+    """
+    try:
+        return os.path.getsize(path) // dtype.itemsize
+    except OSError:
+        return 0
+
+
+def _memmap(path, dtype, count):
+    # memmap of the empty file is an error
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+def _repair(path, dtype, count):
+    """
+    Make the file of the column exactly count values long: drop the values after the last complete row,
+    pad the values lost by the crash with NaN
+    """
+    size = _size(path, dtype)
+    if size >= count:
+        # also drops the partially written value
+        if os.path.exists(path) and os.path.getsize(path) != count * dtype.itemsize:
+            os.truncate(path, count * dtype.itemsize)
+    else:
+        with open(path, 'ab') as f:
+            # the partial value is overwritten
+            f.truncate(size * dtype.itemsize)
+            f.seek(0, os.SEEK_END)
+            f.write(np.full(count - size, np.nan, dtype=dtype))
+
+
+class MetricLog:
+    """
+    Writer of the columnar log: each recorded row is the step, the time and the values of the metrics
+
+    Rows are buffered in memory (one numpy array per column) and appended to the files when
+    buffer_size rows are collected, on flush and on close, so the training thread makes
+    one write per column per buffer_size steps. Metrics which are missing in the row are NaN.
+    The step column is written the last, after the other columns are flushed: readers take
+    the number of rows from its size, so they never see a partially written row. The log in
+    the existing directory is continued, the columns left inconsistent by the crash are repaired
+
+    Args:
+        directory: directory of the log, created if required
+        buffer_size: number of rows written at once
+    """
+    def __init__(self, directory, buffer_size=4096):
+        self.directory = directory
+        self.buffer_size = max(buffer_size, 1)
+
+        self.names = {}  # metric name: column
+        self.files = []  # file name of each column
+        self.starts = []  # row of the first value of each column
+        self.rows = 0  # number of rows on the disk
+        self.runs = [0]  # first row of each run
+
+        self._steps = np.zeros(self.buffer_size, dtype=STEP_DTYPE)
+        self._times = np.zeros(self.buffer_size, dtype=VALUE_DTYPE)
+        self._values = np.full((0, self.buffer_size), np.nan, dtype=VALUE_DTYPE)
+        self._size = 0  # number of buffered rows
+
+        self._lock = threading.Lock()
+        self._handles = None  # files of the columns, steps and times (opened on the first write)
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def __len__(self):
+        return self.rows + self._size
+
+    def record(self, step, metrics):
+        """
+        Append the row of metrics (dict of name: number) reported at the step
+        """
+        with self._lock:
+            row = self._size
+
+            for name, value in metrics.items():
+                column = self.names.get(name)
+                if column is None:
+                    column = self._add_column(name)
+
+                try:
+                    self._values[column, row] = value
+                except (TypeError, ValueError):
+                    continue
+
+            self._steps[row] = step
+            self._times[row] = time.time()
+            self._size += 1
+
+            if self._size == self.buffer_size:
+                self._write()
+
+    def new_run(self):
+        """
+        Start the new run: the following rows are the next training, its steps start again
+        """
+        with self._lock:
+            row = self.rows + self._size
+            if self.runs[-1] != row:
+                self.runs.append(row)
+                self._save()
+
+    def flush(self):
+        """
+        Write the buffered rows to the files
+        """
+        with self._lock:
+            self._write()
+
+    def close(self):
+        """
+        Write the buffered rows and close the files, the next record opens them again
+        """
+        with self._lock:
+            self._write()
+
+            if self._handles is not None:
+                for handle in self._handles:
+                    handle.close()
+                self._handles = None
+
+    def reader(self):
+        """
+        MetricLogReader of the written rows (see flush)
+        """
+        return MetricLogReader(self.directory)
+
+    def _write(self):
+        size = self._size
+        if size == 0:
+            return
+
+        if self._handles is None:
+            self._handles = [open(os.path.join(self.directory, name), 'ab') for name in self.files + [TIMES, STEPS]]
+
+        # the slices of the rows are contiguous, they are written without copying
+        for column, handle in enumerate(self._handles[:-2]):
+            handle.write(self._values[column, max(self.starts[column] - self.rows, 0):size])
+        self._handles[-2].write(self._times[:size])
+
+        # the rows are complete on the disk before their steps are
+        for handle in self._handles[:-1]:
+            handle.flush()
+
+        self._handles[-1].write(self._steps[:size])
+        self._handles[-1].flush()
+
+        self.rows += size
+        self._size = 0
+        self._values.fill(np.nan)
+
+    def _add_column(self, name):
+        column = self.names[name] = len(self.files)
+        self.files.append(_column_file(column, name))
+        # the column starts with the row which is being filled
+        self.starts.append(self.rows + self._size)
+
+        self._values = np.vstack([self._values, np.full((1, self.buffer_size), np.nan, dtype=VALUE_DTYPE)])
+
+        if self._handles is not None:
+            self._handles.insert(column, open(os.path.join(self.directory, self.files[column]), 'ab'))
+
+        self._save()
+
+        return column
+
+    def _load(self):
+        """
+        Continue the existing log: align the columns with the number of the complete rows
+        """
+        path = os.path.join(self.directory, MANIFEST)
+        if not os.path.exists(path):
+            # the empty log is readable too
+            self._save()
+            return
+
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        columns = manifest['columns']
+
+        self.rows = _size(os.path.join(self.directory, STEPS), STEP_DTYPE)
+        # the runs started after the last write have no rows
+        self.runs = sorted({min(row, self.rows) for row in manifest.get('runs', [0])})
+        _repair(os.path.join(self.directory, STEPS), STEP_DTYPE, self.rows)
+        _repair(os.path.join(self.directory, TIMES), VALUE_DTYPE, self.rows)
+
+        for column in columns:
+            # the column added after the last write has no values on the disk
+            start = min(column['start'], self.rows)
+            _repair(os.path.join(self.directory, column['file']), VALUE_DTYPE, self.rows - start)
+
+            self.names[column['name']] = len(self.files)
+            self.files.append(column['file'])
+            self.starts.append(start)
+
+        self._values = np.full((len(self.files), self.buffer_size), np.nan, dtype=VALUE_DTYPE)
+        self._save()
+
+    def _save(self):
+        columns = [{'name': name, 'file': self.files[column], 'start': self.starts[column]}
+                   for name, column in self.names.items()]
+
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'columns': columns, 'runs': self.runs}, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+
+class MetricLogReader:
+    """
+    Zero-copy reader of the columnar log (see MetricLog): the columns are numpy.memmap of the files
+
+        log = MetricLogReader('logs/steps')
+        steps, loss = log.column('loss')
+
+    The rows written by the running training after the reader is created are not visible.
+    The columns are clamped to the sizes of the files, the values missing on the disk are NaN
+
+    Args:
+        directory: directory of the log
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+        columns = manifest['columns']
+
+        rows = min(_size(os.path.join(directory, STEPS), STEP_DTYPE),
+                   _size(os.path.join(directory, TIMES), VALUE_DTYPE))
+        self.steps = _memmap(os.path.join(directory, STEPS), STEP_DTYPE, rows)
+        self.times = _memmap(os.path.join(directory, TIMES), VALUE_DTYPE, rows)
+        self.runs = sorted({min(row, rows) for row in manifest.get('runs', [0])})  # first row of each run
+
+        self.names = {}  # metric name: (row of the first value, memmap of the values)
+        for column in columns:
+            path = os.path.join(directory, column['file'])
+            start = min(column['start'], rows)
+            self.names[column['name']] = (start, _memmap(path, VALUE_DTYPE, min(rows - start,
+                                                                                _size(path, VALUE_DTYPE))))
+
+    def __len__(self):
+        return len(self.steps)
+
+    def column(self, name):
+        """
+        Return (steps, values) of the metric, views of the files
+        """
+        start, values = self.names[name]
+
+        return self.steps[start:start + len(values)], values
+
+    def run_rows(self, run):
+        """
+        (first row, end row) of the run, e.g. -1 - the last run
+        """
+        runs = self.runs + [len(self.steps)]
+        run = run % len(self.runs)
+
+        return runs[run], runs[run + 1]
+
+    def rows(self, first=None, last=None, run=None):
+        """
+        Indices of the rows of the run (None - all runs) with first <= step <= last (None - no bound)
+        """
+        begin, end = self.run_rows(run) if run is not None else (0, len(self.steps))
+        steps = self.steps[begin:end]
+
+        selected = np.ones(len(steps), dtype=bool)
+        if first is not None:
+            selected &= steps >= first
+        if last is not None:
+            selected &= steps <= last
+
+        return begin + np.flatnonzero(selected)
+
+    def export(self, first=None, last=None, names=None, run=None):
+        """
+        Compressed npz (bytes) of the rows of the run (None - all runs) with first <= step <= last:
+        step, time, run and the metrics (all by default)
+        """
+        rows = self.rows(first, last, run)
+        arrays = {'step': self.steps[rows], 'time': self.times[rows],
+                  'run': np.searchsorted(self.runs, rows, side='right') - 1}
+
+        for name in (names if names else list(self.names)):
+            if name not in self.names:
+                continue
+
+            start, values = self.names[name]
+            column = np.full(len(rows), np.nan)
+            present = (rows >= start) & (rows < start + len(values))
+            column[present] = values[rows[present] - start]
+            arrays[name] = column
+
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **arrays)
+
+        return buffer.getvalue()
@@ -0,0 +1,193 @@
+import math
+import time
+
+BUCKETS = 32  # bucket i holds durations in [2^(i-1), 2^i) microseconds, the last one - longer
+BARS = ' ▁▂▃▄▅▆▇█'
+
+
+def _format_seconds(seconds):
+    if seconds < 1e-3:
+        return '{:.0f}us'.format(seconds * 1e6)
+    if seconds < 1:
+        return '{:.1f}ms'.format(seconds * 1e3)
+
+    return '{:.2f}s'.format(seconds)
+
+
+class Timer:
+    """
+    Count, total, max and log2 histogram of durations (microseconds) of the instrumented section
+    """
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * BUCKETS
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+        # exponent of the duration in microseconds: frexp(x)[1] = floor(log2(x)) + 1
+        self.buckets[min(max(math.frexp(seconds * 1e6)[1], 0), BUCKETS - 1)] += 1
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket of the quantile (seconds)
+        """
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                return min(2 ** i * 1e-6, self.max)
+
+        return self.max
+
+    def histogram(self):
+        """
+        Bars of the non-empty range of buckets
+        """
+        used = [i for i, count in enumerate(self.buckets) if count]
+        if not used:
+            return ''
+
+        top = max(self.buckets)
+        bars = ''.join(BARS[math.ceil(self.buckets[i] / top * (len(BARS) - 1))]
+                       for i in range(used[0], used[-1] + 1))
+
+        return '{} [{}] {}'.format(_format_seconds(2 ** (used[0] - 1) * 1e-6 if used[0] else 0), bars,
+                                   _format_seconds(2 ** used[-1] * 1e-6))
+
+
+class PerfStats:
+    """
+    Self-instrumentation of the notifier: timers of the sections on the training thread,
+    counters and gauges (last and max value)
+
+    The section is measured by two monotonic clock reads:
+
+        start = perf.start()
+        ...
+        perf.stop('format', start)
+
+    NULL_PERF has the same interface and does nothing, it disables the instrumentation
+    """
+    enabled = True
+
+    def __init__(self):
+        self.timers = {}  # name: Timer
+        self.counters = {}  # name: number
+        self.gauges = {}  # name: (last, max)
+        self.started = time.monotonic()
+
+    @staticmethod
+    def start():
+        return time.monotonic()
+
+    def stop(self, name, start):
+        self.record(name, time.monotonic() - start)
+
+    def record(self, name, seconds):
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = Timer()
+
+        timer.add(seconds)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        _, maximum = self.gauges.get(name, (value, value))
+        self.gauges[name] = (value, max(maximum, value))
+
+    def reset(self):
+        self.timers = {}
+        self.counters = {}
+        self.gauges = {}
+        self.started = time.monotonic()
+
+    def snapshot(self):
+        """
+        Return dict of the timers (count, total, mean, p50, p99, max in seconds, buckets), counters and gauges
+        """
+        # read from the bot thread while the training thread adds the sections, the dicts are copied
+        timers = {}
+        for name, timer in list(self.timers.items()):
+            timers[name] = {
+                'count': timer.count,
+                'total': timer.total,
+                'mean': timer.total / timer.count if timer.count else 0.0,
+                'p50': timer.quantile(0.5),
+                'p99': timer.quantile(0.99),
+                'max': timer.max,
+                'buckets': list(timer.buckets),
+            }
+
+        return {
+            'elapsed': time.monotonic() - self.started,
+            'timers': timers,
+            'counters': dict(list(self.counters.items())),
+            'gauges': {name: {'last': last, 'max': maximum} for name, (last, maximum) in list(self.gauges.items())},
+        }
+
+    def lines(self):
+        """
+        Lines of the /perf message: the share of the wall time, the quantiles and the histogram of each timer
+        """
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        lines = []
+
+        for name, timer in list(self.timers.items()):
+            lines.append('{}: {} x, {:.3%} of time, p50 {} p99 {} max {}'.format(
+                name, timer.count, timer.total / elapsed, _format_seconds(timer.quantile(0.5)),
+                _format_seconds(timer.quantile(0.99)), _format_seconds(timer.max)))
+            lines.append('  {}'.format(timer.histogram()))
+
+        for name, value in list(self.counters.items()):
+            lines.append('{}: {}'.format(name, value))
+
+        for name, (last, maximum) in list(self.gauges.items()):
+            lines.append('{}: {} (max {})'.format(name, last, maximum))
+
+        return lines
+
+
+class NullPerf:
+    """
+    Disabled instrumentation: the interface of PerfStats without the measurement
+    """
+    enabled = False
+
+    @staticmethod
+    def start():
+        return 0.0
+
+    def stop(self, name, start):
+        pass
+
+    def record(self, name, seconds):
+        pass
+
+    def count(self, name, value=1):
+        pass
+
+    def gauge(self, name, value):
+        pass
+
+    def reset(self):
+        pass
+
+    def snapshot(self):
+        return {'elapsed': 0.0, 'timers': {}, 'counters': {}, 'gauges': {}}
+
+    def lines(self):
+        return []
+
+
+NULL_PERF = NullPerf()
@@ -0,0 +1,289 @@
+"""
+Charts of the metric history rendered to PNG in the worker process
+
+The worker is a separate interpreter (python -m notifyker.utils.plot) started on the first
+chart, matplotlib is imported only there. Jobs and results are pickled frames over its
+stdin and stdout
+"""
+import collections
+import io
+import os
+import pickle
+import struct
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+_HEADER = struct.Struct('>I')
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+VALIDATION_PREFIXES = ('val_', 'validation/')
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling to `threshold` points
+
+    The first and the last points are kept, the rest is split into threshold - 2 buckets.
+    In each bucket the point which forms the largest triangle with the previously selected
+    point and the mean of the next bucket is selected, so the peaks and the shape of the
+    curve are preserved
+
+    Return (x, y) of the selected points, the input if it is not longer than threshold
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+
+    # bucket i holds the points edges[i]:edges[i + 1], the last point is the next bucket of the last one
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+
+        # doubled area of the triangle (a, point, mean of the next bucket)
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return x[selected], y[selected]
+
+
+def panel_key(name):
+    """
+    Title of the panel of the metric: validation metrics share the panel of the training ones
+    """
+    for prefix in VALIDATION_PREFIXES:
+        if name.startswith(prefix):
+            return name[len(prefix):]
+
+    return name
+
+
+def history_panels(history, names=None):
+    """
+    Copy the metrics of MetricHistory to the panels of the chart: list of (title, [(name, x, y)])
+
+    The copy is taken on the calling thread, the history keeps changing during the rendering
+    """
+    panels = collections.OrderedDict()
+    for name in (names if names else list(history.names)):
+        if name not in history.names:
+            continue
+
+        steps, values = history.column(name)
+        finite = np.isfinite(values)
+        if finite.any():
+            panels.setdefault(panel_key(name), []).append((name, steps[finite].astype(np.float64), values[finite]))
+
+    return list(panels.items())
+
+
+def render(job):
+    """
+    Render the job (dict of title, panels, points, size) to PNG bytes, runs in the worker process
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+
+    panels = job['panels']
+    width, height = job['size']
+    figure, axes = plt.subplots(len(panels), 1, figsize=(width, height * len(panels)), squeeze=False, sharex=True)
+
+    for ax, (title, series) in zip(axes[:, 0], panels):
+        for name, x, y in series:
+            x, y = lttb(x, y, job['points'])
+            ax.plot(x, y, label=name, linewidth=1, marker='o' if len(x) < 30 else None, markersize=3)
+
+        ax.set_title(title, fontsize=10)
+        ax.grid(alpha=0.3)
+        if len(series) > 1:
+            ax.legend(fontsize=8)
+
+    axes[-1, 0].set_xlabel(job['xlabel'])
+    if job['title']:
+        figure.suptitle(job['title'])
+    figure.tight_layout()
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png', dpi=job['dpi'])
+    plt.close(figure)
+
+    return buffer.getvalue()
+
+
+def _write_frame(stream, value):
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    stream.write(_HEADER.pack(len(data)))
+    stream.write(data)
+    stream.flush()
+
+
+def _read_frame(stream):
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+
+    return pickle.loads(stream.read(_HEADER.unpack(header)[0]))
+
+
+class ChartRenderer:
+    """
+    Renderer of the charts in the worker process with the cache of the rendered images
+
+    render returns the Future of PNG bytes, the job is passed to the worker by the background
+    thread, so the caller never waits for matplotlib. Images are cached by the key of the
+    caller (e.g. metrics and the version of the history): cached returns the Future of the
+    same key without rendering. Each curve is downsampled by LTTB to `points` points
+
+    Args:
+        points: max number of points of the curve
+        cache_size: number of cached images
+        size: size of the panel (inches)
+        dpi: resolution of the image
+    """
+    def __init__(self, points=500, cache_size=8, size=(8, 3), dpi=100):
+        self.points = points
+        self.cache_size = cache_size
+        self.size = size
+        self.dpi = dpi
+
+        self.rendered = 0  # number of rendered images
+        self.hits = 0  # number of images served from the cache
+
+        self._cache = collections.OrderedDict()  # key: Future of the image
+        self._lock = threading.Lock()
+        self._executor = None
+        self._process = None
+
+    def cached(self, key):
+        """
+        Return the Future of the image rendered with the key or None
+        """
+        with self._lock:
+            future = self._cache.get(key)
+            # failed renders are repeated
+            if future is None or (future.done() and future.exception() is not None):
+                return None
+
+            self._cache.move_to_end(key)
+            self.hits += 1
+
+            return future
+
+    def render(self, key, panels, title=None, xlabel='step'):
+        """
+        Return the Future of PNG bytes of the panels (list of (title, [(name, x, y)])), cache it by the key
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(1, thread_name_prefix='notifyker-charts')
+
+            job = {'panels': panels, 'title': title, 'xlabel': xlabel, 'points': self.points,
+                   'size': self.size, 'dpi': self.dpi}
+            future = self._cache[key] = self._executor.submit(self._render, job)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+            return future
+
+    def _render(self, job):
+        """
+        Pass the job to the worker process, start it if required (background thread)
+        """
+        with self._lock:
+            # the renderer is closed while the job was waiting
+            if self._executor is None:
+                raise RuntimeError('Chart is not rendered. Renderer is closed')
+
+            if self._process is None or self._process.poll() is not None:
+                # the worker imports notifyker from the same place, even if it is not installed
+                env = dict(os.environ)
+                env['PYTHONPATH'] = os.pathsep.join(filter(None, [_ROOT, env.get('PYTHONPATH')]))
+                self._process = subprocess.Popen([sys.executable, '-m', __name__], stdin=subprocess.PIPE,
+                                                 stdout=subprocess.PIPE, env=env)
+            process = self._process
+
+        try:
+            _write_frame(process.stdin, job)
+            result = _read_frame(process.stdout)
+        except (OSError, ValueError) as e:
+            # ValueError - stdin is closed by close
+            result = ('error', str(e))
+
+        if result is None:
+            result = ('error', 'chart worker exited with code {}'.format(process.wait()))
+
+        status, value = result
+        if status != 'ok':
+            raise RuntimeError('Chart is not rendered. {}'.format(value))
+
+        self.rendered += 1
+
+        return value
+
+    def close(self, timeout=5):
+        """
+        Stop the worker process: the queued charts are cancelled, the chart being rendered
+        is given timeout seconds, then the worker is killed
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+            process, self._process = self._process, None
+            self._cache.clear()
+
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if process is not None:
+            # the worker exits after the current chart
+            try:
+                process.stdin.close()
+            except (OSError, ValueError):
+                pass
+
+            try:
+                process.wait(max(timeout, 0))
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+        # the thread of the killed worker gets the end of its output and returns
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+def main():
+    """
+    Worker loop: render the jobs from stdin, write ('ok', png) or ('error', text) to stdout
+    """
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    # nothing else is written to the channel of the results
+    sys.stdout = sys.stderr
+
+    while True:
+        job = _read_frame(stdin)
+        if job is None:
+            return
+
+        try:
+            result = ('ok', render(job))
+        except Exception as e:
+            result = ('error', '{}: {}'.format(type(e).__name__, e))
+
+        _write_frame(stdout, result)
+
+
+if __name__ == '__main__':
+    main()
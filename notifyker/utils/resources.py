@@ -0,0 +1,207 @@
+import collections
+import os
+import threading
+import time
+
+# fields of the sample
+FIELDS = ('time', 'rss', 'cpu', 'system_cpu', 'iowait', 'read_rate', 'write_rate', 'load', 'memory_available',
+          'swap_rate', 'memory_pressure', 'io_pressure')
+
+Sample = collections.namedtuple('Sample', FIELDS, defaults=(None,) * len(FIELDS))
+
+
+def _read(path):
+    try:
+        with open(path) as fh:
+            return fh.read()
+    except OSError:
+        return None
+
+
+def _fields(text):
+    """
+    Parse 'name value' lines of /proc files to dict of name: int
+    """
+    values = {}
+    for line in (text or '').splitlines():
+        parts = line.replace(':', ' ').split()
+        if len(parts) >= 2:
+            try:
+                values[parts[0]] = int(parts[1])
+            except ValueError:
+                continue
+
+    return values
+
+
+def _pressure(text):
+    """
+    Share of the time (avg10 of 'some') stalled on the resource, /proc/pressure/*
+    """
+    for line in (text or '').splitlines():
+        if line.startswith('some'):
+            for part in line.split():
+                if part.startswith('avg10='):
+                    return float(part[len('avg10='):]) / 100
+
+    return None
+
+
+class ResourceSampler:
+    """
+    Background sampler of the host resources from /proc: RSS, CPU utilisation of the process
+    and of the system, iowait, disk I/O rate of the process, load average, available memory,
+    swapping rate and pressure stall information
+
+    The daemon thread reads a few small files each `interval` seconds into the ring of `size`
+    samples. The training thread only reads the last sample, it is never blocked. The values
+    which are not available on the host are None
+
+    Args:
+        interval: seconds between the samples
+        size: number of kept samples
+    """
+    def __init__(self, interval=5.0, size=60):
+        self.interval = interval
+        self.samples = collections.deque(maxlen=size)
+
+        self._page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+        self._previous = None  # counters of the previous sample
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='notifyker-resources', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        self._stop.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def latest(self):
+        """
+        The last sample or None
+        """
+        try:
+            return self.samples[-1]
+        except IndexError:
+            return None
+
+    def sample(self):
+        """
+        Read the resources, append the sample, return it
+        """
+        now = time.monotonic()
+        times = os.times()
+
+        stat = (_read('/proc/stat') or '').split('\n', 1)[0].split()[1:]
+        cpu = [int(i) for i in stat] if stat else None
+        io = _fields(_read('/proc/self/io'))
+        vmstat = _fields(_read('/proc/vmstat'))
+        meminfo = _fields(_read('/proc/meminfo'))
+
+        counters = {
+            'time': now,
+            'process_cpu': times.user + times.system,
+            'system_cpu': cpu,
+            'read_bytes': io.get('read_bytes'),
+            'write_bytes': io.get('write_bytes'),
+            'swap': vmstat['pswpin'] + vmstat['pswpout'] if 'pswpin' in vmstat else None,
+        }
+
+        previous, self._previous = self._previous, counters
+        rates = self._rates(previous, counters) if previous is not None else {}
+
+        statm = (_read('/proc/self/statm') or '').split()
+        rss = int(statm[1]) * self._page_size if len(statm) > 1 else None
+
+        try:
+            load = os.getloadavg()[0]
+        except (AttributeError, OSError):
+            load = None
+
+        available = None
+        if meminfo.get('MemTotal') and 'MemAvailable' in meminfo:
+            available = meminfo['MemAvailable'] / meminfo['MemTotal']
+
+        sample = Sample(time=time.time(), rss=rss, load=load, memory_available=available,
+                        memory_pressure=_pressure(_read('/proc/pressure/memory')),
+                        io_pressure=_pressure(_read('/proc/pressure/io')), **rates)
+        self.samples.append(sample)
+
+        return sample
+
+    def _rates(self, previous, current):
+        elapsed = current['time'] - previous['time']
+        if elapsed <= 0:
+            return {}
+
+        def rate(name):
+            if current[name] is None or previous[name] is None:
+                return None
+            return (current[name] - previous[name]) / elapsed
+
+        rates = {
+            'cpu': rate('process_cpu'),
+            'read_rate': rate('read_bytes'),
+            'write_rate': rate('write_bytes'),
+            'swap_rate': rate('swap'),
+        }
+
+        # /proc/stat: user nice system idle iowait irq softirq steal ...
+        if current['system_cpu'] is not None and previous['system_cpu'] is not None:
+            delta = [c - p for c, p in zip(current['system_cpu'], previous['system_cpu'])]
+            total = sum(delta[:8])
+            if total > 0:
+                rates['system_cpu'] = 1 - (delta[3] + delta[4]) / total
+                rates['iowait'] = delta[4] / total
+
+        return rates
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                print('Resources are not sampled. {}'.format(e))
+
+            self._stop.wait(self.interval)
+
+    def lines(self):
+        """
+        Lines of the message with the last sample, empty if there is no sample
+        """
+        sample = self.latest()
+        if sample is None:
+            return []
+
+        def share(value):
+            return '{:.0%}'.format(value) if value is not None else '-'
+
+        def size(value):
+            return '{:.1f}MB'.format(value / 2 ** 20) if value is not None else '-'
+
+        lines = ['Host: cpu {} (process {}), iowait {}, load {}'.format(
+            share(sample.system_cpu), share(sample.cpu), share(sample.iowait),
+            '{:.2f}'.format(sample.load) if sample.load is not None else '-')]
+        lines.append('Memory: rss {}, available {}, swap {} pages/s'.format(
+            size(sample.rss), share(sample.memory_available),
+            '{:.0f}'.format(sample.swap_rate) if sample.swap_rate is not None else '-'))
+        lines.append('Disk: read {}/s, write {}/s'.format(size(sample.read_rate), size(sample.write_rate)))
+
+        if sample.memory_pressure is not None or sample.io_pressure is not None:
+            lines.append('Pressure: memory {}, io {}'.format(share(sample.memory_pressure),
+                                                             share(sample.io_pressure)))
+
+        return lines
@@ -0,0 +1,149 @@
+import math
+import time
+
+
+class ReportPolicy:
+    """
+    Policy of progress reports: every `iterations` iterations, every `seconds` seconds
+    of the wall time or whichever comes first if both are set
+
+    The check of non-reporting iteration is a comparison (and a clock read if seconds is set)
+
+    Args:
+        iterations: number of iterations between the reports
+        seconds: wall time between the reports
+    """
+    def __init__(self, iterations=None, seconds=None):
+        self.iterations = iterations
+        self.seconds = seconds
+
+        self.interval = iterations  # current number of iterations between the reports
+        self.next_iteration = 0
+        self.deadline = math.inf
+
+    def start(self, iteration=0, default_iterations=None):
+        """
+        Reset the policy at the beginning of the training
+
+        default_iterations is used if neither iterations nor seconds are set
+        """
+        if self.iterations is None and self.seconds is None:
+            self.interval = default_iterations or 1
+
+        self.fired(iteration)
+
+    def due(self, iteration):
+        """
+        Check if the report must be sent at this iteration
+        """
+        if iteration >= self.next_iteration:
+            return True
+
+        return self.seconds is not None and time.monotonic() >= self.deadline
+
+    def fired(self, iteration, cost=None, latency=None):
+        """
+        Mark the report sent at this iteration
+
+        Args:
+            iteration: current iteration
+            cost: time spent by the training thread to prepare and send the report
+            latency: round trip time of the notifier
+        """
+        self.next_iteration = iteration + self.interval if self.interval else math.inf
+
+        if self.seconds is not None:
+            self.deadline = time.monotonic() + self.seconds
+
+    def restart(self, iteration):
+        """
+        Skip the measurement of the current interval (e.g. after the pause of the training)
+        """
+        pass
+
+
+def ewma(average, value, smoothing):
+    """
+    Exponentially weighted moving average, the first value initializes it
+    """
+    if average is None:
+        return value
+
+    return average + smoothing * (value - average)
+
+
+class AdaptivePolicy(ReportPolicy):
+    """
+    Policy which chooses the number of iterations between the reports from the measured
+    duration of the step and the cost of the report
+
+    The interval is chosen to send the report each target_seconds, but not more often than
+    the overhead budget allows (the cost of the report divided by the time of the interval)
+    and not more often than the notifier delivers messages. Durations are smoothed by EWMA,
+    the chosen number of iterations is available as interval
+
+    Args:
+        target_seconds: desired wall time between the reports
+        overhead_budget: max share of the training time spent on the reports, 0.005 is 0.5%
+        smoothing: EWMA factor of the measurements
+        min_iterations: min number of iterations between the reports
+        max_iterations: max number of iterations between the reports
+    """
+    def __init__(self, target_seconds=30, overhead_budget=0.005, smoothing=0.3, min_iterations=1,
+                 max_iterations=None):
+        super().__init__()
+        self.target_seconds = target_seconds
+        self.overhead_budget = overhead_budget
+        self.smoothing = smoothing
+        self.min_iterations = min_iterations
+        self.max_iterations = max_iterations
+
+        self.step_time = None  # average duration of the training step
+        self.report_cost = None  # average time of the report on the training thread
+        self.send_latency = None  # average round trip time of the notifier
+
+        self._last_iteration = 0
+        self._last_time = None
+
+    def start(self, iteration=0, default_iterations=None):
+        # the first interval is used to measure the step time
+        self.interval = default_iterations or self.min_iterations
+        self.restart(iteration)
+        super().fired(iteration)
+
+    def fired(self, iteration, cost=None, latency=None):
+        now = time.monotonic()
+        steps = iteration - self._last_iteration
+
+        if steps > 0 and self._last_time is not None:
+            # the time of this report is not a part of the training steps
+            elapsed = now - self._last_time - (cost or 0.0)
+            self.step_time = ewma(self.step_time, max(elapsed, 0.0) / steps, self.smoothing)
+
+        if cost is not None:
+            self.report_cost = ewma(self.report_cost, cost, self.smoothing)
+
+        if latency is not None:
+            self.send_latency = latency
+
+        self.interval = self._choose_interval()
+        self._last_iteration, self._last_time = iteration, now
+
+        super().fired(iteration)
+
+    def restart(self, iteration):
+        self._last_iteration, self._last_time = iteration, time.monotonic()
+
+    def _choose_interval(self):
+        if not self.step_time:
+            return self.interval
+
+        seconds = max(self.target_seconds, self.send_latency or 0.0)
+        if self.report_cost is not None and self.overhead_budget:
+            seconds = max(seconds, self.report_cost / self.overhead_budget)
+
+        interval = max(int(seconds / self.step_time), self.min_iterations, 1)
+        if self.max_iterations is not None:
+            interval = min(interval, self.max_iterations)
+
+        return interval
@@ -0,0 +1,247 @@
+import bisect
+import math
+import threading
+
+
+def _adjust(qa, q, qb, na, n, nb, s):
+    """
+    New height of the marker moved by s (+-1) position: parabolic prediction, linear if it breaks the order
+    """
+    height = q + s / (nb - na) * ((n - na + s) * (qb - q) / (nb - n) + (nb - n - s) * (q - qa) / (n - na))
+    if not qa < height < qb:
+        height = q + s * ((qb - q) / (nb - n) if s > 0 else (qa - q) / (na - n))
+
+    return height
+
+
+class P2Quantile:
+    """
+    Streaming estimate of the quantile with 5 markers (P-square algorithm of Jain and Chlamtac)
+
+    Constant memory and time per value, the first 5 values are kept exactly. extend adds the
+    batch of values in one loop over the local copy of the markers
+
+    Args:
+        p: quantile, 0 < p < 1
+    """
+    def __init__(self, p):
+        self.p = p
+
+        self.heights = []  # heights of the markers, sorted
+        self.positions = [1, 2, 3, 4, 5]
+        self.added = 0  # number of values after the first 5, the desired positions are linear in it
+
+    def add(self, x):
+        self.extend((x,))
+
+    def extend(self, values):
+        q = self.heights
+        values = iter(values)
+        while len(q) < 5:
+            x = next(values, None)
+            if x is None:
+                return
+            bisect.insort(q, x)
+
+        p = self.p
+        # desired position of the marker i is c_i + m * r_i
+        c1, c2, c3 = 1 + 2 * p, 1 + 4 * p, 3 + 2 * p
+        r1, r2, r3 = p / 2, p, (1 + p) / 2
+        q0, q1, q2, q3, q4 = q
+        # the first marker is always at the position 1
+        _, n1, n2, n3, n4 = self.positions
+        m = self.added
+
+        for x in values:
+            # the markers above the cell of the value are shifted, the extreme markers are moved to it
+            if x < q1:
+                if x < q0:
+                    q0 = x
+                n1 += 1
+                n2 += 1
+                n3 += 1
+            elif x < q2:
+                n2 += 1
+                n3 += 1
+            elif x < q3:
+                n3 += 1
+            elif x > q4:
+                q4 = x
+            n4 += 1
+            m += 1
+
+            # adjust heights of the middle markers to their desired positions
+            delta = c1 + m * r1 - n1
+            if (delta >= 1 and n2 - n1 > 1) or (delta <= -1 and n1 > 2):
+                s = 1 if delta > 0 else -1
+                q1 = _adjust(q0, q1, q2, 1, n1, n2, s)
+                n1 += s
+
+            delta = c2 + m * r2 - n2
+            if (delta >= 1 and n3 - n2 > 1) or (delta <= -1 and n1 - n2 < -1):
+                s = 1 if delta > 0 else -1
+                q2 = _adjust(q1, q2, q3, n1, n2, n3, s)
+                n2 += s
+
+            delta = c3 + m * r3 - n3
+            if (delta >= 1 and n4 - n3 > 1) or (delta <= -1 and n2 - n3 < -1):
+                s = 1 if delta > 0 else -1
+                q3 = _adjust(q2, q3, q4, n2, n3, n4, s)
+                n3 += s
+
+        self.heights = [q0, q1, q2, q3, q4]
+        self.positions = [1, n1, n2, n3, n4]
+        self.added = m
+
+    def value(self):
+        q = self.heights
+        if not q:
+            return math.nan
+
+        if len(q) < 5:
+            return q[int(round(self.p * (len(q) - 1)))]
+
+        return q[2]
+
+
+class MetricSketch:
+    """
+    Constant-memory summary of the stream of metric values: count, mean and variance (Welford),
+    min, max, quantiles (P-square) and number of non-finite values
+
+    Non-finite values (NaN, Inf) are counted only, they do not spoil the other statistics
+
+    Args:
+        quantiles: quantiles to estimate
+    """
+    def __init__(self, quantiles=(0.05, 0.5, 0.95)):
+        self.quantiles = [P2Quantile(p) for p in quantiles]
+
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.nonfinite = 0
+
+    def add(self, value):
+        self.extend((value,))
+
+    def extend(self, values):
+        """
+        Add the batch of values, non-numeric values are skipped
+        """
+        finite = []
+        count, mean, m2 = self.count, self.mean, self._m2
+        for value in values:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+
+            if not math.isfinite(value):
+                self.nonfinite += 1
+                continue
+
+            finite.append(value)
+            count += 1
+            delta = value - mean
+            mean += delta / count
+            m2 += delta * (value - mean)
+
+        if not finite:
+            return
+
+        self.count, self.mean, self._m2 = count, mean, m2
+
+        self.min = min(self.min, min(finite))
+        self.max = max(self.max, max(finite))
+
+        for quantile in self.quantiles:
+            quantile.extend(finite)
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def format(self, name):
+        """
+        Line of the message: mean, std, quantiles, min/max and the number of non-finite values
+        """
+        if not self.count:
+            return '{:15s}: nan/inf {}'.format(name, self.nonfinite)
+
+        parts = ['mean {:.4g} std {:.3g}'.format(self.mean, self.std)]
+        parts.extend('p{:g} {:.4g}'.format(100 * q.p, q.value()) for q in self.quantiles)
+        parts.append('min {:.4g} max {:.4g}'.format(self.min, self.max))
+        if self.nonfinite:
+            parts.append('nan/inf {}'.format(self.nonfinite))
+
+        return '{:15s}: {}'.format(name, ' '.join(parts))
+
+
+class SketchSet:
+    """
+    MetricSketch of each metric of the stream, created on the first value
+
+    The values are collected in lists and added to the sketches by batches of `batch` steps
+    (and before the sketches are read), so the training thread pays a list append per metric
+    on most steps. The sketches are read from the bot thread too, the lock guards them
+
+    Args:
+        quantiles: quantiles to estimate
+        batch: number of steps collected before the update of the sketches
+    """
+    def __init__(self, quantiles=(0.05, 0.5, 0.95), batch=256):
+        self.quantiles = quantiles
+        self.batch = batch
+        self.sketches = {}  # metric name: MetricSketch
+
+        self._pending = {}  # metric name: values which are not added to the sketch yet
+        self._steps = 0  # number of steps in the pending values
+        self._lock = threading.Lock()
+
+    def update(self, metrics):
+        """
+        Add values of metrics (dict of name: number), non-numeric values are skipped
+        """
+        with self._lock:
+            pending = self._pending
+            for name, value in metrics.items():
+                values = pending.get(name)
+                if values is None:
+                    values = pending[name] = []
+                values.append(value)
+
+            self._steps += 1
+            if self._steps >= self.batch:
+                self._flush()
+
+    def lines(self):
+        with self._lock:
+            self._flush()
+
+            return [sketch.format(name) for name, sketch in self.sketches.items()
+                    if sketch.count or sketch.nonfinite]
+
+    def reset(self):
+        with self._lock:
+            self.sketches = {}
+            self._pending = {}
+            self._steps = 0
+
+    def _flush(self):
+        sketches = self.sketches
+        for name, values in self._pending.items():
+            sketch = sketches.get(name)
+            if sketch is None:
+                sketch = sketches[name] = MetricSketch(self.quantiles)
+
+            sketch.extend(values)
+
+        self._pending = {}
+        self._steps = 0
@@ -0,0 +1,144 @@
+import time
+
+
+class StallDetector:
+    """
+    Split of the step time into waiting for the data and computation, alert if the input pipeline is the bottleneck
+
+    With the batch hooks (Keras) the waiting is the time from the end of the previous batch hook
+    to the beginning of the next batch (begin, end, resume). Otherwise the waiting is measured around
+    the fetch of the batch (add_wait) and the computation is the rest of the step (lap)
+
+    The alert is returned once when the EWMA of the waiting share of the step exceeds threshold,
+    the next one only after it drops below the half of threshold
+
+    Args:
+        threshold: share of the step time spent waiting for the data
+        smoothing: smoothing of the EWMA of the waiting share
+        min_steps: number of steps before the alert
+    """
+    def __init__(self, threshold=0.3, smoothing=0.05, min_steps=20):
+        self.threshold = threshold
+        self.smoothing = smoothing
+        self.min_steps = min_steps
+
+        self.start()
+
+    def start(self):
+        """
+        Reset the detector at the beginning of the training
+        """
+        self.steps = 0
+        self.wait_time = 0.0  # total time of waiting for the data (seconds)
+        self.compute_time = 0.0  # total time of the computation (seconds)
+        self.wait_share = None  # EWMA of the waiting share of the step
+
+        self._alerted = False
+        self._begin = None
+        self._end = None
+        self._wait = 0.0  # waiting of the current step
+
+    def begin(self):
+        """
+        Mark the beginning of the batch
+        """
+        now = time.monotonic()
+        if self._end is not None:
+            self._wait = now - self._end
+
+        self._begin = now
+
+    def end(self):
+        """
+        Mark the end of the batch, return the alert or None
+        """
+        now = time.monotonic()
+        if self._begin is None:
+            return None
+
+        compute = now - self._begin
+        self._begin = None
+        self._end = now
+
+        return self.record(compute)
+
+    def resume(self):
+        """
+        Mark the end of the work of the callback after the batch (messages, commands),
+        the waiting for the next batch is measured from here
+        """
+        if self._end is not None:
+            self._end = time.monotonic()
+
+    def add_wait(self, seconds):
+        """
+        Add the time of the batch fetch to the current step
+        """
+        self._wait += seconds
+
+    def lap(self):
+        """
+        Mark the end of the step measured by add_wait, return the alert or None
+        """
+        now = time.monotonic()
+        if self._end is None:
+            self._end = now
+            self._wait = 0.0
+            return None
+
+        compute = max(now - self._end - self._wait, 0.0)
+        self._end = now
+
+        return self.record(compute)
+
+    def record(self, compute):
+        """
+        Account the step: waiting of the step and compute seconds, return the alert or None
+        """
+        wait, self._wait = self._wait, 0.0
+        self.steps += 1
+        self.wait_time += wait
+        self.compute_time += compute
+
+        total = wait + compute
+        if total <= 0:
+            return None
+
+        share = wait / total
+        if self.wait_share is None:
+            self.wait_share = share
+        else:
+            self.wait_share += self.smoothing * (share - self.wait_share)
+
+        if self.steps < self.min_steps:
+            return None
+
+        if not self._alerted and self.wait_share > self.threshold:
+            self._alerted = True
+            return 'Input pipeline stall: {:.0%} of the step time is spent waiting for the data'.format(
+                self.wait_share)
+
+        if self._alerted and self.wait_share < self.threshold / 2:
+            self._alerted = False
+
+        return None
+
+    def restart(self):
+        """
+        Skip the measurement of the current step (e.g. after the pause of the training)
+        """
+        self._end = None
+        self._begin = None
+        self._wait = 0.0
+
+    def lines(self):
+        """
+        Lines of the message with the breakdown of the step time, empty if nothing is measured
+        """
+        total = self.wait_time + self.compute_time
+        if not self.steps or total <= 0:
+            return []
+
+        return ['Step time: data {:.0%} ({:.3g}s/step), compute {:.0%} ({:.3g}s/step), now data {:.0%}'.format(
+            self.wait_time / total, self.wait_time / self.steps, self.compute_time / total,
+            self.compute_time / self.steps, self.wait_share or 0.0)]
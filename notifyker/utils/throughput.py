@@ -0,0 +1,181 @@
+import time
+
+
+def format_duration(seconds):
+    """
+    Format seconds as H:MM:SS
+    """
+    if seconds is None:
+        return '-'
+
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    return '{}:{:02d}:{:02d}'.format(hours, minutes, seconds)
+
+
+class ThroughputMeter:
+    """
+    Steps and samples per second of the training, wall time of epochs and ETA
+
+    The rate is measured twice: EWMA of the step duration (reacts fast) and the mean over
+    the last `window` steps (stable). Both use the monotonic clock of the training thread,
+    the update of the step is a clock read and a few arithmetic operations. The time of
+    the pause is excluded (see exclude)
+
+    Args:
+        smoothing: smoothing of the EWMA of the step duration
+        window: number of the steps of the windowed rate
+    """
+    def __init__(self, smoothing=0.1, window=100):
+        self.smoothing = smoothing
+        self.window = window
+
+        self.start()
+
+    def start(self, epochs=None, steps_per_epoch=None, batch_size=None, step=0):
+        """
+        Reset the meter at the beginning of the training
+
+        Args:
+            epochs: number of epochs of the training, unknown if None
+            steps_per_epoch: number of steps of the epoch, unknown if None
+            batch_size: samples per step, unknown if None
+            step: current step
+        """
+        self.epochs = epochs
+        self.steps_per_epoch = steps_per_epoch
+        self.batch_size = batch_size
+
+        now = time.monotonic()
+        self.step_time = None  # EWMA of the step duration (seconds)
+        self.epoch = 0  # number of completed epochs
+        self.epoch_times = []  # wall time of completed epochs (seconds)
+        self.samples = 0  # samples from the beginning of the training
+
+        self._last, self._last_step = now, step
+        self._epoch_start, self._epoch_step = now, step
+        # ring of (time, step, samples)
+        self._ring = [(now, step, 0)]
+        self._ring_index = 0
+
+    def step(self, step, samples=None):
+        """
+        Mark the end of the step (global step number), samples of the step - batch_size by default
+        """
+        now = time.monotonic()
+        steps = step - self._last_step
+        if steps <= 0:
+            return
+
+        if samples is None:
+            samples = steps * self.batch_size if self.batch_size else 0
+        self.samples += samples
+
+        duration = (now - self._last) / steps
+        if self.step_time is None:
+            self.step_time = duration
+        else:
+            self.step_time += self.smoothing * (duration - self.step_time)
+
+        self._last, self._last_step = now, step
+
+        # keep the point of `window` steps ago
+        ring = self._ring
+        if len(ring) < self.window:
+            ring.append((now, step, self.samples))
+        else:
+            ring[self._ring_index] = (now, step, self.samples)
+            self._ring_index = (self._ring_index + 1) % self.window
+
+    def begin_epoch(self):
+        """
+        Mark the beginning of the epoch, the time since the last step (e.g. validation) is not a part of the step
+        """
+        now = time.monotonic()
+        self._epoch_start, self._epoch_step = now, self._last_step
+        self._last = now
+
+    def end_epoch(self):
+        """
+        Mark the end of the epoch, return its wall time (seconds)
+        """
+        duration = time.monotonic() - self._epoch_start
+        self.epoch_times.append(duration)
+        self.epoch += 1
+
+        self.begin_epoch()
+
+        return duration
+
+    def exclude(self, seconds):
+        """
+        Exclude the interval (e.g. the pause of the training) from the measurement
+        """
+        self._last += seconds
+        self._epoch_start += seconds
+        self._ring = [(moment + seconds, step, samples) for moment, step, samples in self._ring]
+
+    def rates(self):
+        """
+        Return (steps per second, samples per second) over the window, None if unknown
+        """
+        ring = self._ring
+        first = ring[self._ring_index] if len(ring) == self.window else ring[0]
+        last = ring[self._ring_index - 1]
+
+        elapsed = last[0] - first[0]
+        if elapsed <= 0:
+            return None, None
+
+        return (last[1] - first[1]) / elapsed, (last[2] - first[2]) / elapsed if last[2] > first[2] else None
+
+    def eta(self):
+        """
+        Return (seconds to the end of the epoch, seconds to the end of the training), None if unknown
+        """
+        if self.step_time is None or not self.steps_per_epoch:
+            return None, None
+
+        remaining = max(self.steps_per_epoch - (self._last_step - self._epoch_step), 0)
+        epoch = remaining * self.step_time
+
+        if self.epochs is None:
+            return epoch, None
+
+        if self.epoch >= self.epochs:
+            return 0.0, 0.0
+
+        # wall time of the epoch includes validation, use it when it is measured
+        if self.epoch_times:
+            epoch_time = sum(self.epoch_times[-3:]) / len(self.epoch_times[-3:])
+        else:
+            epoch_time = self.steps_per_epoch * self.step_time
+
+        epochs_left = self.epochs - self.epoch - 1
+        return epoch, epoch + epochs_left * epoch_time
+
+    def lines(self):
+        """
+        Lines of the message with the rates and ETA, empty if nothing is measured
+        """
+        if self.step_time is None:
+            return []
+
+        current = 1 / self.step_time if self.step_time > 0 else float('inf')
+        steps, samples = self.rates()
+
+        rate = 'Speed: {:.3g} steps/s (now {:.3g})'.format(steps if steps else current, current)
+        if samples:
+            rate += ', {:.4g} samples/s'.format(samples)
+
+        lines = [rate]
+
+        epoch, run = self.eta()
+        if epoch is not None:
+            lines.append('ETA: epoch {}, training {}'.format(format_duration(epoch), format_duration(run)))
+
+        if self.epoch_times:
+            lines.append('Last epoch time: {}'.format(format_duration(self.epoch_times[-1])))
+
+        return lines
@@ -0,0 +1,157 @@
+import numpy as np
+
+
+class DivergenceMonitor:
+    """
+    Streaming rules which detect the wasted run: non-finite metric, loss exploded above
+    `factor` times its EWMA, no improvement of the monitored metric for `patience` epochs
+
+    The step rules are evaluated for all metrics of the step at once (numpy vector of the
+    values), the EWMA is updated with finite values only. Each rule alerts once per metric
+    in the run
+
+    Args:
+        factor: loss is exploded if it is above factor * EWMA of the loss
+        smoothing: smoothing of the EWMA
+        warmup: number of steps before the explosion rule is evaluated
+        patience: number of epochs without improvement of the monitored metric, None - no plateau rule
+        min_delta: min decrease of the monitored metric counted as the improvement
+        monitor: metric of the plateau rule, by default the validation loss (the loss without validation)
+        stop: interrupt the training on the alert
+    """
+    def __init__(self, factor=10.0, smoothing=0.01, warmup=20, patience=None, min_delta=0.0, monitor=None,
+                 stop=False):
+        self.factor = factor
+        self.smoothing = smoothing
+        self.warmup = warmup
+        self.patience = patience
+        self.min_delta = min_delta
+        self.monitor = monitor
+        self.stop = stop
+
+        self.reset()
+
+    def reset(self):
+        self._columns = {}  # metric name: index in the arrays
+        self._loss = np.zeros(0, dtype=bool)  # mask of the losses
+        self._ewma = np.zeros(0)
+        self._seen = np.zeros(0, dtype=np.int64)  # number of finite values
+        self._keys = None  # names of the metrics of the last step
+        self._index = None  # their indices
+        self._steady = False  # the fast path of check is used
+        self._alerted = set()  # (rule, metric)
+
+        self._best = None
+        self._best_epoch = None
+
+    def check(self, step, metrics):
+        """
+        Evaluate the step rules, return list of alerts
+        """
+        keys = tuple(metrics)
+        if keys != self._keys:
+            self._select(keys)
+
+        try:
+            values = np.fromiter(metrics.values(), dtype=np.float64, count=len(keys))
+        except (TypeError, ValueError):
+            return []
+
+        # steady state: the same metrics in the order of the columns as in the previous steps,
+        # all of them are finite and warmed up
+        if self._steady and np.isfinite(values.sum()):
+            ewma = self._ewma
+            if np.greater(np.abs(values) * self._loss, self.factor * np.abs(ewma)).any():
+                self._steady = False
+            else:
+                ewma += self.smoothing * (values - ewma)
+                return []
+
+        index = self._index
+        ewma = self._ewma[index]
+        seen = self._seen[index]
+        finite = np.isfinite(values)
+        alerts = []
+
+        if not finite.all():
+            alerts.extend(self._alert('nonfinite', keys, ~finite, 'Step {step}: {name} is not finite', step))
+
+        with np.errstate(invalid='ignore'):
+            exploded = (self._loss[index] & finite & (seen >= self.warmup) &
+                        (np.abs(values) > self.factor * np.abs(ewma)))
+        if exploded.any():
+            alerts.extend(self._alert('exploded', keys, exploded,
+                                      'Step {step}: {name} exploded above {factor:g} x its average', step))
+
+        updated = np.where(seen == 0, values, ewma + self.smoothing * (values - ewma))
+        self._ewma[index] = np.where(finite, updated, ewma)
+        self._seen[index] = seen + finite
+
+        # the fast path uses the arrays in the order of the keys
+        self._steady = (len(keys) == len(self._columns) and bool((index == np.arange(len(index))).all()) and
+                        bool(finite.all() and self._seen.min() >= self.warmup))
+
+        return alerts
+
+    def check_epoch(self, epoch, metrics):
+        """
+        Evaluate the non-finite and plateau rules on the epoch metrics, return list of alerts
+        """
+        alerts = []
+        for name, value in metrics.items():
+            try:
+                finite = np.isfinite(float(value))
+            except (TypeError, ValueError):
+                continue
+
+            if not finite and ('nonfinite', name) not in self._alerted:
+                self._alerted.add(('nonfinite', name))
+                alerts.append('Epoch {}: {} is not finite'.format(epoch, name))
+
+        if self.patience is None:
+            return alerts
+
+        name = self.monitor if self.monitor is not None else self._default_monitor(metrics)
+        try:
+            value = float(metrics[name])
+        except (KeyError, TypeError, ValueError):
+            return alerts
+
+        if self._best is None or value < self._best - self.min_delta:
+            self._best, self._best_epoch = value, epoch
+        elif epoch - self._best_epoch >= self.patience and ('plateau', name) not in self._alerted:
+            self._alerted.add(('plateau', name))
+            alerts.append('Epoch {}: {} has not improved for {} epochs (best {:.4g} at epoch {})'.format(
+                epoch, name, epoch - self._best_epoch, self._best, self._best_epoch))
+
+        return alerts
+
+    def _select(self, keys):
+        new = [key for key in keys if key not in self._columns]
+        for key in new:
+            self._columns[key] = len(self._columns)
+
+        if new:
+            self._loss = np.concatenate([self._loss, ['loss' in key for key in new]])
+            self._ewma = np.concatenate([self._ewma, np.zeros(len(new))])
+            self._seen = np.concatenate([self._seen, np.zeros(len(new), dtype=np.int64)])
+
+        self._keys = keys
+        self._index = np.array([self._columns[key] for key in keys], dtype=np.intp)
+        self._steady = False
+
+    def _alert(self, rule, keys, mask, template, step):
+        alerts = []
+        for index in np.flatnonzero(mask):
+            if (rule, keys[index]) not in self._alerted:
+                self._alerted.add((rule, keys[index]))
+                alerts.append(template.format(step=step, name=keys[index], factor=self.factor))
+
+        return alerts
+
+    @staticmethod
+    def _default_monitor(metrics):
+        losses = [name for name in metrics if 'loss' in name]
+        validation = [name for name in losses if 'val' in name]
+
+        return (validation or losses or [None])[0]
@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+import pytest
+
+from notifyker.notifiers.notifier_base import NotifierBase
+from notifyker.utils import ReportPolicy
+
+
+class RecordingNotifier(NotifierBase):
+    """
+    Notifier which keeps the sent messages
+    """
+    active = True
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def _connect(self):
+        pass
+
+    def message(self, message, message_id=None, priority=None):
+        self.messages.append(message)
+        return SimpleNamespace(message_id=len(self.messages))
+
+
+def _fit(callback, on_batch_begin, on_batch_end, epochs, batches=3):
+    callback.set_params({'epochs': epochs, 'steps': batches, 'samples': batches, 'batch_size': 1,
+                         'metrics': ['loss']})
+    callback.on_train_begin()
+    for epoch in range(epochs):
+        callback.on_epoch_begin(epoch)
+        for batch in range(batches):
+            on_batch_begin(batch)
+            on_batch_end(batch, {'loss': 1.0, 'size': 1})
+        callback.on_epoch_end(epoch, {'loss': 1.0})
+    callback.on_train_end()
+
+
+def _epochs(messages):
+    return [line for message in messages for line in message.split(' \n') if line.startswith('Epoch ')]
+
+
+def test_keras_reused_callback_counts_epochs_again():
+    pytest.importorskip('keras')
+    from notifyker.keras import CallbackSimple
+
+    notifier = RecordingNotifier()
+    callback = CallbackSimple(notifier, policy=ReportPolicy(iterations=1000))
+
+    _fit(callback, callback.on_batch_begin, callback.on_batch_end, epochs=2)
+    notifier.messages.clear()
+    _fit(callback, callback.on_batch_begin, callback.on_batch_end, epochs=2)
+
+    assert _epochs(notifier.messages) == ['Epoch 1 / 2', 'Epoch 2 / 2']
+
+
+def test_tf_keras_reused_callback_counts_epochs_again():
+    pytest.importorskip('tensorflow')
+    from notifyker.tf_keras import CallbackSimpleTF
+
+    notifier = RecordingNotifier()
+    callback = CallbackSimpleTF(notifier, policy=ReportPolicy(iterations=1000))
+
+    _fit(callback, callback.on_train_batch_begin, callback.on_train_batch_end, epochs=2)
+    notifier.messages.clear()
+    _fit(callback, callback.on_train_batch_begin, callback.on_train_batch_end, epochs=2)
+
+    assert _epochs(notifier.messages) == ['Epoch 1 / 2', 'Epoch 2 / 2']
+
+
+def test_keras_send_failure_is_reported_once(capsys):
+    pytest.importorskip('keras')
+    from notifyker.keras import CallbackSimple
+
+    class FailingNotifier(RecordingNotifier):
+        def message(self, message, message_id=None, priority=None):
+            if message.startswith('Epoch'):
+                raise RuntimeError('chat is not found')
+            return super().message(message, message_id, priority)
+
+    notifier = FailingNotifier()
+    callback = CallbackSimple(notifier, policy=ReportPolicy(iterations=1))
+
+    _fit(callback, callback.on_batch_begin, callback.on_batch_end, epochs=2)
+
+    assert capsys.readouterr().out.count('chat is not found') == 1
+    assert notifier.messages[-1].startswith('Training completed successfully')
+    assert notifier.cache_message_id is None
@@ -0,0 +1,35 @@
+import pytest
+
+from notifyker.utils.history import MetricHistory
+
+
+def test_summary():
+    history = MetricHistory()
+    for step in range(1, 11):
+        history.record(step, {'loss': 1 / step})
+
+    minimum, mean, last = history.summary()['loss']
+    assert minimum == pytest.approx(0.1)
+    assert last == pytest.approx(0.1)
+    assert history.summary(window=1)['loss'] == pytest.approx((0.1, 0.1, 0.1))
+
+
+@pytest.mark.parametrize('window', [0, -5])
+def test_summary_of_empty_window(window):
+    history = MetricHistory()
+    for step in (10, 20, 30):
+        history.record(step, {'loss': step})
+
+    assert history.summary(window=window) == {}
+
+
+def test_summary_of_window_shorter_than_step_spacing():
+    history = MetricHistory()
+    for step in (10, 20, 30):
+        history.record(step, {'loss': step})
+
+    assert history.summary(window=5) == {'loss': (30.0, 30.0, 30.0)}
+
+
+def test_summary_of_empty_history():
+    assert MetricHistory().summary(window=10) == {}
@@ -0,0 +1,58 @@
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+
+from notifyker.utils import plot
+from notifyker.utils.plot import ChartRenderer, lttb
+
+PANELS = [('loss', [('loss', np.arange(10.0), np.arange(10.0))])]
+
+
+def test_lttb_keeps_ends_and_peak():
+    x = np.arange(1000.0)
+    y = np.zeros(1000)
+    y[500] = 10.0
+
+    sx, sy = lttb(x, y, 50)
+
+    assert len(sx) == 50
+    assert sx[0] == 0 and sx[-1] == 999
+    assert sy.max() == 10.0
+
+
+def test_render():
+    pytest.importorskip('matplotlib')
+    charts = ChartRenderer()
+    try:
+        image = charts.render('key', PANELS).result(60)
+    finally:
+        charts.close()
+
+    assert image.startswith(b'\x89PNG')
+    assert charts.cached('key') is None
+
+
+def test_close_kills_busy_worker(monkeypatch):
+    popen = subprocess.Popen
+
+    def hanging_worker(args, **kwargs):
+        # the worker which never answers
+        return popen([sys.executable, '-c', 'import time; time.sleep(60)'], **kwargs)
+
+    monkeypatch.setattr(plot.subprocess, 'Popen', hanging_worker)
+
+    charts = ChartRenderer()
+    running = charts.render('running', PANELS)
+    queued = charts.render('queued', PANELS)
+    time.sleep(0.5)
+
+    start = time.monotonic()
+    charts.close(0.2)
+
+    assert time.monotonic() - start < 5
+    assert queued.cancelled()
+    with pytest.raises(RuntimeError):
+        running.result(5)
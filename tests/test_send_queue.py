@@ -0,0 +1,47 @@
+import threading
+
+import pytest
+
+from notifyker.notifiers.send_queue import MessageRef, SendJob, SendQueue
+
+
+@pytest.mark.parametrize('overflow', SendQueue.OVERFLOW_POLICIES)
+def test_put_after_stop(overflow):
+    delivered = []
+    queue = SendQueue(delivered.append, maxsize=1, overflow=overflow)
+    queue.start()
+    queue.stop(1)
+
+    # the empty and the full queue: nothing would deliver the job
+    assert not queue.put(SendJob('first', MessageRef()))
+    assert not queue.put(SendJob('second', MessageRef()))
+    assert len(queue) == 0
+    assert delivered == []
+
+
+@pytest.mark.parametrize('overflow', SendQueue.OVERFLOW_POLICIES)
+def test_put_before_start(overflow):
+    queue = SendQueue(lambda job: None, overflow=overflow)
+
+    assert not queue.put(SendJob('text', MessageRef()))
+
+
+def test_blocked_put_is_rejected_by_stop():
+    release = threading.Event()
+    queue = SendQueue(lambda job: release.wait(5), maxsize=1, overflow='block')
+    queue.start()
+
+    # the first job is in flight, the second one fills the queue
+    assert queue.put(SendJob('first', MessageRef()))
+    assert queue.put(SendJob('second', MessageRef()))
+
+    result = []
+    blocked = threading.Thread(target=lambda: result.append(queue.put(SendJob('third', MessageRef()))))
+    blocked.start()
+
+    queue.stop(0)
+    release.set()
+    blocked.join(5)
+
+    assert result == [False]
+
@@ -0,0 +1,96 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from notifyker.notifiers.notifier_base import NotifierBase
+from notifyker.utils import ReportPolicy
+from notifyker.utils.stall import StallDetector
+
+COMPUTE = 0.002  # seconds of the batch
+SEND = 0.02  # seconds of the message sending
+
+
+class SlowNotifier(NotifierBase):
+    """
+    Notifier with the slow synchronous message sending
+    """
+    active = True
+
+    def _connect(self):
+        pass
+
+    def message(self, message, message_id=None, priority=None):
+        time.sleep(SEND)
+        return SimpleNamespace(message_id=1)
+
+
+def test_resume_excludes_hook_time():
+    stall = StallDetector(min_steps=1)
+
+    for _ in range(30):
+        stall.begin()
+        time.sleep(COMPUTE)
+        assert stall.end() is None
+        # the work of the callback after the batch
+        time.sleep(SEND)
+        stall.resume()
+
+    assert stall.wait_share < 0.3
+    assert stall.wait_time < stall.compute_time
+
+
+def test_resume_after_restart():
+    stall = StallDetector()
+    stall.restart()
+    stall.resume()
+
+    stall.begin()
+    stall.end()
+    assert stall.wait_time == 0.0
+
+
+def _params(epochs, batches):
+    return {'epochs': epochs, 'steps': batches, 'samples': batches, 'batch_size': 1, 'metrics': ['loss']}
+
+
+def _fit(callback, on_batch_begin, on_batch_end, epochs=1, batches=30):
+    callback.on_train_begin()
+    for epoch in range(epochs):
+        callback.on_epoch_begin(epoch)
+        for batch in range(batches):
+            on_batch_begin(batch)
+            time.sleep(COMPUTE)
+            on_batch_end(batch, {'loss': 1.0, 'size': 1})
+        callback.on_epoch_end(epoch, {'loss': 1.0})
+
+
+def test_keras_message_is_not_stall():
+    pytest.importorskip('keras')
+    from notifyker.keras import CallbackSimple
+
+    notifier = SlowNotifier()
+    notifier.stall = StallDetector(min_steps=5)
+    notifier.alert = lambda text, stop=False: pytest.fail(text)
+    callback = CallbackSimple(notifier, policy=ReportPolicy(iterations=1))
+    callback.set_params(_params(1, 30))
+
+    _fit(callback, callback.on_batch_begin, callback.on_batch_end)
+
+    assert notifier.stall.wait_share < 0.3
+
+
+def test_tf_keras_message_is_not_stall():
+    pytest.importorskip('tensorflow')
+    from notifyker.tf_keras import CallbackSimpleTF
+
+    notifier = SlowNotifier()
+    notifier.verbose_value = 2
+    notifier.stall = StallDetector(min_steps=5)
+    notifier.alert = lambda text, stop=False: pytest.fail(text)
+    callback = CallbackSimpleTF(notifier, policy=ReportPolicy(iterations=1))
+    callback.set_params(_params(1, 30))
+
+    _fit(callback, callback.on_train_batch_begin, callback.on_train_batch_end)
+
+    assert notifier.stall.wait_share < 0.3